@@ -5,8 +5,14 @@ from __future__ import annotations
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.const import Platform
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.typing import ConfigType
 
 from . import cyberiot_intelligent
+from .const import DOMAIN
+from .hub import async_get_hub
+from .live import async_setup_live
+from .storage import ApolloStore
 
 # List of platforms to support. There should be a matching .py file for each,
 # eg <cover.py> and <sensor.py>
@@ -14,6 +20,14 @@ PLATFORMS = [Platform.SENSOR]
 
 type ApolloConfigEntry = ConfigEntry[cyberiot_intelligent.CyberiotApollo]
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up the websocket API shared by all entries."""
+    async_setup_live(hass)
+    return True
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ApolloConfigEntry) -> bool:
     """Set up Hello World from a config entry."""
@@ -28,11 +42,18 @@ async def async_setup_entry(hass: HomeAssistant, entry: ApolloConfigEntry) -> bo
     return True
 
 
-async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+async def async_unload_entry(hass: HomeAssistant, entry: ApolloConfigEntry) -> bool:
     """Unload a config entry."""
     # This is called when an entry/configured device is to be removed. The class
     # needs to unload itself, and remove callbacks. See the classes for further
     # details
+    # 先停止设备连接: 之后连接已关闭, 卸载实体释放的需求、选项更新和定时器都不会再访问设备
+    await async_get_hub(hass).async_remove_device(entry.entry_id)
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
-
+    await entry.runtime_data.async_close()
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the persisted state of a deleted config entry."""
+    await ApolloStore(hass, entry.entry_id).async_remove()
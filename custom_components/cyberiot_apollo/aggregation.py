@@ -0,0 +1,204 @@
+"""Derived values computed incrementally from the decoded frame stream."""
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Sequence
+from datetime import timedelta
+from typing import Any
+
+from homeassistant.util import dt as dt_util
+
+
+def next_local_midnight(timestamp: int) -> int:
+    """Return the timestamp of the local midnight after timestamp."""
+    day = dt_util.as_local(dt_util.utc_from_timestamp(timestamp)).date()
+    return int(dt_util.start_of_local_day(day + timedelta(days=1)).timestamp())
+
+
+class RollingMean:
+    """Mean of every slot over a sliding time window.
+
+    One running sum per slot; frames are kept as they are and subtracted
+    again when they leave the window, so an update costs one addition and
+    usually one subtraction per slot regardless of the window length.
+    """
+
+    __slots__ = ("window", "started", "_times", "_values", "sums")
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        # 窗口开始填充的时间, 清空后重新计算
+        self.started: int | None = None
+        self._times: deque[int] = deque()
+        self._values: deque[Sequence[int]] = deque()
+        self.sums: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    def clear(self, slot_count: int = 0) -> None:
+        """Empty the window."""
+        self.started = None
+        self._times.clear()
+        self._values.clear()
+        self.sums = [0] * slot_count
+
+    def add(self, timestamp: int, values: Sequence[int]) -> None:
+        """Add the values of one frame and expire what left the window."""
+        if len(values) != len(self.sums) or (self._times and timestamp < self._times[-1]):
+            # 布局变化或时间回退时重新开始
+            self.clear(len(values))
+        if self.started is None:
+            self.started = timestamp
+        sums = self.sums
+        self._times.append(timestamp)
+        self._values.append(values)
+        for slot, value in enumerate(values):
+            sums[slot] += value
+        horizon = timestamp - self.window
+        times = self._times
+        while times[0] <= horizon:
+            times.popleft()
+            for slot, value in enumerate(self._values.popleft()):
+                sums[slot] -= value
+
+    def covers(self) -> bool:
+        """Return True once the frames span a whole window since the last reset."""
+        return bool(self._times) and self._times[-1] - self.started >= self.window
+
+    def mean(self, slot: int) -> float | None:
+        """Return the mean of a slot, None while the window is empty."""
+        if not self._times:
+            return None
+        return self.sums[slot] / len(self._times)
+
+
+class FrameAggregator:
+    """Rolling average, peak demand, daily energy and unmetered load.
+
+    Peak demand is the highest mean of the main channel over the demand
+    window since local midnight, counted only once the window is full.
+    Daily energy is the energy counter of a slot minus its value at the
+    first frame of the local day, or the first frame a new slot appeared in.
+    """
+
+    def __init__(self, average_window: float, demand_window: float) -> None:
+        self.average = RollingMean(average_window)
+        self.demand = RollingMean(demand_window)
+        self.peak: float | None = None
+        self.day_end = 0
+        self.day_start: list[int] = []
+        self.unmetered: int | None = None
+        self._energy: Sequence[int] = ()
+
+    def configure(self, average_window: float, demand_window: float) -> None:
+        """Change the window lengths, restarting windows that changed."""
+        if average_window != self.average.window:
+            self.average = RollingMean(average_window)
+        if demand_window != self.demand.window:
+            self.demand = RollingMean(demand_window)
+
+    def update(self, frame: Any) -> bool:
+        """Fold a frame into the aggregates.
+
+        Return True when the state returned by as_dict changed.
+        """
+        timestamp = frame.timestamp
+        power = frame.power
+        energy = self._energy = frame.energy
+        self.average.add(timestamp, power)
+        self.demand.add(timestamp, power[:1])
+        if len(power) > 1:
+            self.unmetered = power[0] - sum(power[1:])
+        else:
+            self.unmetered = None
+
+        changed = False
+        if timestamp >= self.day_end:
+            self.peak = None
+            self.day_end = next_local_midnight(timestamp)
+            self.day_start = list(energy)
+            changed = True
+        elif len(energy) > len(self.day_start):
+            # 布局变化时保留已有通道的基准, 新通道从当前值开始
+            self.day_start.extend(energy[len(self.day_start):])
+            changed = True
+        if self.demand.covers():
+            demand = self.demand.mean(0)
+            if self.peak is None or demand > self.peak:
+                self.peak = demand
+                changed = True
+        return changed
+
+    def daily_energy(self, slot: int) -> float | None:
+        """Return the energy of a slot since local midnight in kWh."""
+        if slot >= len(self._energy):
+            return None
+        used = self._energy[slot] - self.day_start[slot]
+        if used < 0:
+            # 计数器被重置, 以当前值为新的起点
+            self.day_start[slot] = self._energy[slot]
+            used = 0
+        return used / 1000
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the state that has to survive a restart."""
+        return {"day_end": self.day_end, "day_start": self.day_start, "peak": self.peak}
+
+    def restore(self, data: dict[str, Any] | None) -> None:
+        """Continue the current day from a saved state."""
+        if not data:
+            return
+        self.day_end = data.get("day_end", 0)
+        self.day_start = list(data.get("day_start", ()))
+        self.peak = data.get("peak")
+
+
+class Downsampler:
+    """Min, max and mean of every slot over fixed windows.
+
+    Windows are aligned to multiples of the window length in device time,
+    so all channels and all devices close their windows together.
+    """
+
+    __slots__ = ("window", "count", "mins", "maxs", "sums", "_index")
+
+    def __init__(self, window: int) -> None:
+        self.window = window
+        self.count = 0
+        self.mins: list[int] = []
+        self.maxs: list[int] = []
+        self.sums: list[int] = []
+        self._index: int | None = None
+
+    def add(
+        self, timestamp: int, values: Sequence[int]
+    ) -> tuple[list[int], list[int], list[float]] | None:
+        """Fold in one frame.
+
+        Return (min, max, mean) of the previous window when this frame
+        starts a new one. A window cut short by a layout change is dropped.
+        """
+        index = timestamp // self.window
+        if index == self._index and len(values) == len(self.sums):
+            self.count += 1
+            mins = self.mins
+            maxs = self.maxs
+            sums = self.sums
+            for slot, value in enumerate(values):
+                sums[slot] += value
+                if value < mins[slot]:
+                    mins[slot] = value
+                elif value > maxs[slot]:
+                    maxs[slot] = value
+            return None
+        closed = None
+        if self.count and len(values) == len(self.sums):
+            count = self.count
+            closed = (self.mins, self.maxs, [total / count for total in self.sums])
+        self._index = index
+        self.count = 1
+        self.mins = list(values)
+        self.maxs = list(values)
+        self.sums = list(values)
+        return closed
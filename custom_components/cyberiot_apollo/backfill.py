@@ -0,0 +1,182 @@
+"""Historical backfill of device logs into long-term statistics."""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any
+
+import aiohttp
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics,
+    get_last_statistics,
+)
+from homeassistant.const import UnitOfEnergy
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN
+from .cyberiot_intelligent import CyberiotApollo
+from .decoder import ApolloFrame, channel_name
+from .storage import ApolloStore
+
+_LOGGER = logging.getLogger(__name__)
+
+HOUR = 3600
+# Size of the time window requested from /sync in one call
+CHUNK_SECONDS = 6 * HOUR
+# How far back the first backfill of a device reaches
+MAX_WINDOW_SECONDS = 7 * 24 * HOUR
+
+
+class _ChannelStatistics:
+    """Hourly energy sum of one channel, built incrementally."""
+
+    __slots__ = ("metadata", "imported_until", "hour", "state", "sum", "pending")
+
+    def __init__(self, metadata: StatisticMetaData) -> None:
+        self.metadata = metadata
+        # Start of the first hour that has not been imported yet
+        self.imported_until = 0
+        self.hour: int | None = None
+        self.state: int | None = None
+        self.sum = 0.0
+        self.pending: list[StatisticData] = []
+
+    def seed(self, row: dict[str, Any] | None) -> None:
+        """Continue from the last imported statistics row."""
+        if row is None:
+            return
+        self.imported_until = int(row["start"]) + HOUR
+        self.state = row.get("state")
+        self.sum = row.get("sum") or 0.0
+
+    def add(self, timestamp: int, energy: int) -> None:
+        hour = timestamp - timestamp % HOUR
+        if hour < self.imported_until:
+            return
+        if self.hour is not None and hour != self.hour:
+            self._close()
+        self.hour = hour
+        if self.state is not None:
+            delta = energy - self.state
+            # 计数器复位
+            self.sum += delta if delta >= 0 else energy
+        self.state = energy
+
+    def _close(self) -> None:
+        self.pending.append(
+            StatisticData(
+                start=dt_util.utc_from_timestamp(self.hour),
+                state=self.state,
+                sum=self.sum,
+            )
+        )
+        self.imported_until = self.hour + HOUR
+        self.hour = None
+
+    def take(self, before: int) -> list[StatisticData]:
+        """Return the rows of the hours that end at or before ``before``."""
+        if self.hour is not None and self.hour + HOUR <= before:
+            self._close()
+        rows, self.pending = self.pending, []
+        return rows
+
+
+class ApolloBackfill:
+    """Fill gaps in the energy history from the device's logged frames.
+
+    Logged frames are requested from ``/sync`` in chunks and streamed into
+    hourly external statistics, one ``cyberiot_apollo:`` series per channel
+    next to the energy sensor's own statistics, which are left untouched.
+    The series can be picked in the Energy dashboard instead of the sensor.
+    The persisted high-water mark makes every run fetch only what has not
+    been imported yet.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, apollo: CyberiotApollo, store: ApolloStore
+    ) -> None:
+        self._hass = hass
+        self._apollo = apollo
+        self._store = store
+        self._channels: list[_ChannelStatistics] = []
+        self.running = False
+
+    def _statistic_id(self, slot: int) -> str:
+        object_id = f"{self._apollo.serial_number_name}_{channel_name(slot)}_energy"
+        return f"{DOMAIN}:{object_id.lower().replace('-', '_')}"
+
+    async def _async_add_channels(self, slot_count: int) -> None:
+        instance = get_instance(self._hass)
+        for slot in range(len(self._channels), slot_count):
+            statistic_id = self._statistic_id(slot)
+            channel = _ChannelStatistics(
+                StatisticMetaData(
+                    has_mean=False,
+                    has_sum=True,
+                    name=f"{self._apollo.serial_number_name} {channel_name(slot)} Energy",
+                    source=DOMAIN,
+                    statistic_id=statistic_id,
+                    unit_of_measurement=UnitOfEnergy.WATT_HOUR,
+                )
+            )
+            last = await instance.async_add_executor_job(
+                get_last_statistics, self._hass, 1, statistic_id, True, {"state", "sum"}
+            )
+            channel.seed(last[statistic_id][0] if last.get(statistic_id) else None)
+            self._channels.append(channel)
+
+    def _add_frame(self, frame: ApolloFrame) -> None:
+        timestamp = frame.timestamp
+        energy = frame.energy
+        for slot, channel in enumerate(self._channels[: frame.slot_count]):
+            channel.add(timestamp, energy[slot])
+
+    def _flush(self, before: int) -> None:
+        for channel in self._channels:
+            if rows := channel.take(before):
+                async_add_external_statistics(self._hass, channel.metadata, rows)
+
+    async def async_run(self, device_uuid: str) -> None:
+        """Import the history between the high-water mark and the last full hour."""
+        if self.running or "recorder" not in self._hass.config.components:
+            return
+        self.running = True
+        try:
+            await self._async_run(device_uuid)
+        except (aiohttp.ClientError, ValueError) as err:
+            _LOGGER.warning(
+                "History backfill of %s stopped: %s",
+                self._apollo.serial_number_name,
+                err,
+            )
+        finally:
+            self.running = False
+
+    async def _async_run(self, device_uuid: str) -> None:
+        now = int(time.time())
+        end = now - now % HOUR
+        start = max(self._store.high_water_mark or 0, end - MAX_WINDOW_SECONDS)
+        while start < end:
+            chunk_end = min(start + CHUNK_SECONDS, end)
+            frames = 0
+            async for frame in self._apollo.sync_frames(device_uuid, start, chunk_end):
+                if not start <= frame.timestamp < chunk_end:
+                    continue
+                if frame.slot_count > len(self._channels):
+                    await self._async_add_channels(frame.slot_count)
+                self._add_frame(frame)
+                frames += 1
+            self._flush(chunk_end)
+            self._store.async_set_high_water_mark(chunk_end)
+            _LOGGER.debug(
+                "Imported %s logged frames of %s between %s and %s",
+                frames,
+                self._apollo.serial_number_name,
+                start,
+                chunk_end,
+            )
+            start = chunk_end
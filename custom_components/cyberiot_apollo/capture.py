@@ -0,0 +1,133 @@
+"""Capture of raw websocket frames for offline replay.
+
+A capture file starts with MAGIC and holds one record per frame: the
+receive time as a little-endian double, the frame length as uint32 and the
+frame bytes as received. Files are rotated like log files, ``name.1`` being
+the newest backup.
+"""
+from __future__ import annotations
+
+from collections.abc import Iterator
+import mmap
+from pathlib import Path
+import struct
+
+MAGIC = b"APOLLOC1"
+RECORD = struct.Struct("<dI")
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+FLUSH_BYTES = 64 * 1024
+
+
+class CaptureWriter:
+    """Append buffers of records to a size-bounded, rotated file.
+
+    Blocking; call it from an executor.
+    """
+
+    def __init__(
+        self, path: Path, max_bytes: int = DEFAULT_MAX_BYTES, backups: int = DEFAULT_BACKUPS
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = None
+        self._size = 0
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "ab")  # noqa: SIM115
+        self._size = self._file.tell()
+        if not self._size:
+            self._file.write(MAGIC)
+            self._size = len(MAGIC)
+
+    def _rotate(self) -> None:
+        self.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                source.replace(self.path.with_name(f"{self.path.name}.{index + 1}"))
+        if self.backups:
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+
+    def write(self, data: bytes) -> None:
+        """Write whole records, rotating first if the file would overflow."""
+        if self._file is None:
+            self._open()
+        if self._size > len(MAGIC) and self._size + len(data) > self.max_bytes:
+            self._rotate()
+            self._open()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+
+    def close(self) -> None:
+        """Close the current file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class FrameCapture:
+    """Collect records in memory until a buffer is worth writing out."""
+
+    def __init__(self, writer: CaptureWriter, flush_bytes: int = FLUSH_BYTES) -> None:
+        self.writer = writer
+        self.flush_bytes = flush_bytes
+        self.flushing = False
+        self.closing = False
+        self.records = 0
+        self._buffer = bytearray()
+
+    @property
+    def buffered(self) -> int:
+        """Return the number of bytes waiting to be written."""
+        return len(self._buffer)
+
+    def append(self, received: float, data: bytes) -> bool:
+        """Add a frame; True once the buffer should be flushed."""
+        buffer = self._buffer
+        buffer += RECORD.pack(received, len(data))
+        buffer += data
+        self.records += 1
+        return len(buffer) >= self.flush_bytes
+
+    def take(self) -> bytes:
+        """Return and clear the buffered records."""
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def read_capture(path: Path) -> Iterator[tuple[float, memoryview]]:
+    """Yield (receive time, frame) of every record of a capture file.
+
+    The file is memory-mapped and frames are views into the mapping, so
+    they are only valid until the next record is requested. A truncated
+    last record is ignored.
+    """
+    with open(path, "rb") as file:
+        if file.seek(0, 2) <= len(MAGIC):
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped[: len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a frame capture")
+            view = memoryview(mapped)
+            try:
+                offset = len(MAGIC)
+                size = len(mapped)
+                while offset + RECORD.size <= size:
+                    received, length = RECORD.unpack_from(mapped, offset)
+                    offset += RECORD.size
+                    if offset + length > size:
+                        break
+                    frame = view[offset : offset + length]
+                    offset += length
+                    yield received, frame
+                    frame.release()
+            finally:
+                view.release()
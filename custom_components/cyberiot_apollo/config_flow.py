@@ -12,14 +12,53 @@ from homeassistant import config_entries, exceptions
 from homeassistant.core import HomeAssistant
 
 from .cyberiot_intelligent import CyberiotApollo
+from .frame_queue import POLICIES
 
 from homeassistant.core import callback
 from homeassistant.components import zeroconf
-from homeassistant.config_entries import ConfigFlow, ConfigFlowResult
+from homeassistant.config_entries import (
+    ConfigEntry,
+    ConfigFlow,
+    ConfigFlowResult,
+    OptionsFlow,
+)
 from homeassistant.const import CONF_HOST, CONF_NAME, CONF_PORT
 from homeassistant.util.network import is_ip_address as is_ip
 
-from .const import DOMAIN, SERIAL_NUMBER
+from .const import (
+    CONF_AVERAGE_WINDOW,
+    CONF_CAPTURE,
+    CONF_DEMAND_WINDOW,
+    CONF_DOWNSAMPLE_WINDOW,
+    CONF_IDLE_HOURS,
+    CONF_MAX_STALENESS,
+    CONF_METRICS,
+    CONF_MIN_WRITE_INTERVAL,
+    CONF_POWER_DEADBAND,
+    CONF_POWER_DEADBAND_PERCENT,
+    CONF_QUEUE_POLICY,
+    CONF_QUEUE_SIZE,
+    CONF_SKIP_UNCHANGED,
+    CONF_TRACK_ACTIVITY,
+    CONF_VERIFY_CRC,
+    DEFAULT_AVERAGE_WINDOW,
+    DEFAULT_CAPTURE,
+    DEFAULT_DEMAND_WINDOW,
+    DEFAULT_DOWNSAMPLE_WINDOW,
+    DEFAULT_IDLE_HOURS,
+    DEFAULT_MAX_STALENESS,
+    DEFAULT_METRICS,
+    DEFAULT_MIN_WRITE_INTERVAL,
+    DEFAULT_POWER_DEADBAND,
+    DEFAULT_POWER_DEADBAND_PERCENT,
+    DEFAULT_QUEUE_POLICY,
+    DEFAULT_QUEUE_SIZE,
+    DEFAULT_SKIP_UNCHANGED,
+    DEFAULT_TRACK_ACTIVITY,
+    DEFAULT_VERIFY_CRC,
+    DOMAIN,
+    SERIAL_NUMBER,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -55,6 +94,12 @@ class ApolloFlowHandler(ConfigFlow, domain=DOMAIN):
         """Initialize the apollo config flow."""
         self.discovered_conf: dict[str, Any] = {}
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: ConfigEntry) -> OptionsFlow:
+        """Get the options flow for this handler."""
+        return ApolloOptionsFlowHandler()
+
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
     ) -> ConfigFlowResult:
@@ -114,11 +159,12 @@ class ApolloFlowHandler(ConfigFlow, domain=DOMAIN):
                 host,
                 existing_entry.unique_id,
             )
-            self.hass.config_entries.async_update_entry(
+            # 重新加载条目, 旧连接停止后再用新地址连接
+            return self.async_update_reload_and_abort(
                 existing_entry,
                 data={**existing_entry.data, CONF_HOST: host},
+                reason="reconfigure_successful",
             )
-            return self.async_abort(reason="reconfigure_successful")
 
         if existing_entry:
             return self.async_abort(reason="already_configured")
@@ -197,6 +243,88 @@ class ApolloFlowHandler(ConfigFlow, domain=DOMAIN):
         return result
 
 
+class ApolloOptionsFlowHandler(OptionsFlow):
+    """Handle sensor write policy options."""
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        """Manage the options."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self.config_entry.options
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema({
+                vol.Required(
+                    CONF_SKIP_UNCHANGED,
+                    default=options.get(CONF_SKIP_UNCHANGED, DEFAULT_SKIP_UNCHANGED),
+                ): bool,
+                vol.Required(
+                    CONF_POWER_DEADBAND,
+                    default=options.get(CONF_POWER_DEADBAND, DEFAULT_POWER_DEADBAND),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                vol.Required(
+                    CONF_POWER_DEADBAND_PERCENT,
+                    default=options.get(
+                        CONF_POWER_DEADBAND_PERCENT, DEFAULT_POWER_DEADBAND_PERCENT
+                    ),
+                ): bool,
+                vol.Required(
+                    CONF_MIN_WRITE_INTERVAL,
+                    default=options.get(
+                        CONF_MIN_WRITE_INTERVAL, DEFAULT_MIN_WRITE_INTERVAL
+                    ),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                vol.Required(
+                    CONF_MAX_STALENESS,
+                    default=options.get(CONF_MAX_STALENESS, DEFAULT_MAX_STALENESS),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+                vol.Required(
+                    CONF_METRICS,
+                    default=options.get(CONF_METRICS, DEFAULT_METRICS),
+                ): bool,
+                vol.Required(
+                    CONF_QUEUE_POLICY,
+                    default=options.get(CONF_QUEUE_POLICY, DEFAULT_QUEUE_POLICY),
+                ): vol.In(POLICIES),
+                vol.Required(
+                    CONF_QUEUE_SIZE,
+                    default=options.get(CONF_QUEUE_SIZE, DEFAULT_QUEUE_SIZE),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1, max=1024)),
+                vol.Required(
+                    CONF_AVERAGE_WINDOW,
+                    default=options.get(CONF_AVERAGE_WINDOW, DEFAULT_AVERAGE_WINDOW),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1, max=86400)),
+                vol.Required(
+                    CONF_DEMAND_WINDOW,
+                    default=options.get(CONF_DEMAND_WINDOW, DEFAULT_DEMAND_WINDOW),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1, max=86400)),
+                vol.Required(
+                    CONF_DOWNSAMPLE_WINDOW,
+                    default=options.get(CONF_DOWNSAMPLE_WINDOW, DEFAULT_DOWNSAMPLE_WINDOW),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=3600)),
+                vol.Required(
+                    CONF_CAPTURE,
+                    default=options.get(CONF_CAPTURE, DEFAULT_CAPTURE),
+                ): bool,
+                vol.Required(
+                    CONF_TRACK_ACTIVITY,
+                    default=options.get(CONF_TRACK_ACTIVITY, DEFAULT_TRACK_ACTIVITY),
+                ): bool,
+                vol.Required(
+                    CONF_IDLE_HOURS,
+                    default=options.get(CONF_IDLE_HOURS, DEFAULT_IDLE_HOURS),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1, max=24 * 365)),
+                vol.Required(
+                    CONF_VERIFY_CRC,
+                    default=options.get(CONF_VERIFY_CRC, DEFAULT_VERIFY_CRC),
+                ): bool,
+            }),
+        )
+
+
 class CannotConnect(exceptions.HomeAssistantError):
     """Error to indicate we cannot connect."""
 
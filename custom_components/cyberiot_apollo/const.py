@@ -4,3 +4,50 @@
 # name for the integration.
 DOMAIN = "cyberiot_apollo"
 SERIAL_NUMBER = "serial_number"
+
+# Options controlling when sensor states are written to Home Assistant.
+CONF_SKIP_UNCHANGED = "skip_unchanged"
+CONF_POWER_DEADBAND = "power_deadband"
+CONF_POWER_DEADBAND_PERCENT = "power_deadband_percent"
+CONF_MIN_WRITE_INTERVAL = "min_write_interval"
+CONF_MAX_STALENESS = "max_staleness"
+
+DEFAULT_SKIP_UNCHANGED = True
+DEFAULT_POWER_DEADBAND = 0.0
+DEFAULT_POWER_DEADBAND_PERCENT = False
+DEFAULT_MIN_WRITE_INTERVAL = 0.0
+DEFAULT_MAX_STALENESS = 300.0
+
+# Enable latency histograms on the websocket pipeline.
+CONF_METRICS = "metrics"
+DEFAULT_METRICS = False
+
+# Hand-off between websocket receive and dispatch.
+CONF_QUEUE_POLICY = "queue_policy"
+CONF_QUEUE_SIZE = "queue_size"
+DEFAULT_QUEUE_POLICY = "latest"
+DEFAULT_QUEUE_SIZE = 32
+
+# Windows of the derived sensors, in seconds.
+CONF_AVERAGE_WINDOW = "average_window"
+CONF_DEMAND_WINDOW = "demand_window"
+DEFAULT_AVERAGE_WINDOW = 300
+DEFAULT_DEMAND_WINDOW = 900
+
+# Write one state per window of this many seconds, 0 writes every frame.
+CONF_DOWNSAMPLE_WINDOW = "downsample_window"
+DEFAULT_DOWNSAMPLE_WINDOW = 0
+
+# Capture raw frames to <config>/cyberiot_apollo/<device>.cap for replay.
+CONF_CAPTURE = "capture"
+DEFAULT_CAPTURE = False
+
+# Only create entities for channels that carry load and hide idle ones.
+CONF_TRACK_ACTIVITY = "track_activity"
+CONF_IDLE_HOURS = "idle_hours"
+DEFAULT_TRACK_ACTIVITY = False
+DEFAULT_IDLE_HOURS = 24
+
+# Drop packets whose payload does not match the CRC-32 in their header.
+CONF_VERIFY_CRC = "verify_crc"
+DEFAULT_VERIFY_CRC = False
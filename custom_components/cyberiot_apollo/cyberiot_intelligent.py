@@ -5,6 +5,10 @@ import aiohttp
 
 from homeassistant.core import HomeAssistant
 
+from .decoder import FrameStream
+from .endpoint import EndpointResolver
+from .session import ApolloSession
+
 
 class CyberiotApollo:
 
@@ -13,124 +17,94 @@ class CyberiotApollo:
         self.serial_number = serial_number_name.split("-")[-1]
         self._hass = hass
         self._host = host
-        self.apollo_type = 2
+        self.session = ApolloSession(hass)
+        # serial / serial.local / host are raced and the winner is cached
+        self.resolver = EndpointResolver(
+            self.session,
+            (serial_number_name, serial_number_name + ".local", host))
         self.uuid_url = "http://{}/register"
         self.sync_url = "http://{}/sync"
         self.data_url = "http://{}/data-ctrl"
         self.main_info_url = "http://{}/system-info"
+        self.websocket_url = "ws://{}/ws/interface?uuid={}"
+
+    async def async_close(self):
+        """Stop background work; the pooled session is shared and stays open."""
+        self.resolver.cancel()
 
-    async def register_uuid(self, host):
+    async def _request(self, method, url, op, payload=None):
+        """Send a request to the resolved endpoint.
+
+        A failing cached endpoint is invalidated and the request is retried
+        once against a freshly resolved one.
+        """
+        for attempt in range(2):
+            endpoint = await self.resolver.async_resolve()
+            try:
+                return await self.session.request(
+                    method, url.format(endpoint), op, payload)
+            except aiohttp.ClientError:
+                self.resolver.invalidate(endpoint)
+                if attempt:
+                    raise
+        return None
+
+    async def websocket_url_for(self, device_uuid):
+        """Return the websocket URL on the resolved endpoint."""
+        endpoint = await self.resolver.async_resolve()
+        return self.websocket_url.format(endpoint, device_uuid)
+
+    async def register_uuid(self):
         """Register a UUID."""
         data = {"user": self.serial_number,
                 "password": "cyber2019"}
-        json_data = json.dumps(data)
-        for ind in range(3):
-            if ind == 0:
-                url = self.uuid_url.format(self.serial_number_name)
-                self.apollo_type = "serial_number"
-            elif ind == 1:
-                url = self.uuid_url.format(self.serial_number_name + ".local")
-                self.apollo_type = "serial_number_local"
-            else:
-                url = self.uuid_url.format(host)
-                self.apollo_type = "host"
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, data=json_data) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            res = data.get("uuid", None)
-                            break
-                        else:
-                            res = None
-                            continue
-            except aiohttp.ClientError as e:
-                # raise Exception(self.uuid_url2, e)
-                # 处理网络错误
-                res = None
-                continue
-        return res
+        try:
+            body = await self._request("POST", self.uuid_url, "register", data)
+            if body is not None:
+                return json.loads(body).get("uuid", None)
+        except (aiohttp.ClientError, ValueError):
+            # 处理网络错误
+            pass
+        return None
 
-    async def sync_data(self, device_uuid, host):
-        """Sampling data synchronization settings"""
+    async def sync_frames(self, device_uuid, timestamp_from, timestamp_to):
+        """Stream the logged frames of a time window from /sync.
+
+        The response body is parsed incrementally, so a large window is never
+        held in memory.
+        """
         data = {"uuid": device_uuid,
-                "timestampFrom": 0,
-                "timestampTo": 0}
-        json_data = json.dumps(data)
-        for ind in range(3):
-            if ind == 0:
-                url = self.sync_url.format(self.serial_number_name)
-            elif ind == 1:
-                url = self.sync_url.format(self.serial_number_name + ".local")
-            else:
-                url = self.sync_url.format(host)
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, data=json_data) as response:
-                        if response.status == 200:
-                            res = True
-                            break
-                        else:
-                            res = False
-                            continue
-            except aiohttp.ClientError as e:
-                # 处理网络错误
-                res = False
-                continue
-        return res
+                "timestampFrom": timestamp_from,
+                "timestampTo": timestamp_to}
+        endpoint = await self.resolver.async_resolve()
+        stream = FrameStream()
+        try:
+            async for chunk in self.session.iter_post(
+                    self.sync_url.format(endpoint), data, "sync"):
+                for frame in stream.feed(chunk):
+                    yield frame
+        except aiohttp.ClientResponseError:
+            raise
+        except aiohttp.ClientError:
+            self.resolver.invalidate(endpoint)
+            raise
 
-    async def data_ctrl(self, device_uuid, host):
+    async def data_ctrl(self, device_uuid, rtdata_enable=1, sync_enable=0, logdata_enable=0):
         """Data transmission control"""
         data = {"uuid": device_uuid,
-                "rtdataEnable": 1,
-                "syncEnable": 0,
-                "logdataEnable": 0}
-        json_data = json.dumps(data)
-        for ind in range(3):
-            if ind == 0:
-                url = self.data_url.format(self.serial_number_name)
-            elif ind == 1:
-                url = self.data_url.format(self.serial_number_name + ".local")
-            else:
-                url = self.data_url.format(host)
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, data=json_data) as response:
-                        if response.status == 200:
-                            res = True
-                            break
-                        else:
-                            res = False
-                            continue
-            except aiohttp.ClientError as e:
-                # 处理网络错误
-                res = False
-                continue
-        return res
+                "rtdataEnable": rtdata_enable,
+                "syncEnable": sync_enable,
+                "logdataEnable": logdata_enable}
+        try:
+            return await self._request("POST", self.data_url, "data_ctrl", data) is not None
+        except aiohttp.ClientError:
+            # 处理网络错误
+            return False
 
     async def check_connection(self) -> bool:
         """Test connection."""
-        for ind in range(3):
-            if ind == 0:
-                url = self.main_info_url.format(self.serial_number_name)
-            elif ind == 1:
-                url = self.main_info_url.format(self.serial_number_name + ".local")
-            else:
-                url = self.main_info_url.format(self._host)
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url) as response:
-                        if response.status == 200:
-                            res = True
-                            break
-                        else:
-                            res = False
-                            continue
-            except aiohttp.ClientError as e:
-                # 处理网络错误
-                res = False
-                continue
-        return res
-
-
-
+        try:
+            return await self._request("GET", self.main_info_url, "system_info") is not None
+        except aiohttp.ClientError:
+            # 处理网络错误
+            return False
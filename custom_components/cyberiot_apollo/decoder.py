@@ -0,0 +1,299 @@
+"""Binary frame decoder for the Apollo websocket stream."""
+from __future__ import annotations
+
+from array import array
+from collections.abc import Callable
+import logging
+from struct import Struct
+from typing import Any
+from zlib import crc32
+
+_LOGGER = logging.getLogger(__name__)
+
+# apolloWsPkgHead: version, crc, type, length
+HEAD = Struct("<IIII")
+# sampleDataWsPayload prefix: timeStamp, subDevNum, mainChData (Power, Energy)
+SAMPLE_PREFIX = Struct("<IBiI")
+# subDevChData: number followed by 10 (Power, Energy) pairs
+CHANNELS_PER_SUB_DEV = 10
+SUB_DEV = Struct("<B" + "iI" * CHANNELS_PER_SUB_DEV)
+
+PKG_TYPE_SAMPLE_DATA = 2
+# Upper bound for the length field when splitting a byte stream into frames
+MAX_FRAME_LENGTH = 0xFFFF
+# Distinct (version, type) kinds a PacketRegistry counts separately
+MAX_PACKET_KINDS = 16
+
+HEAD_SIZE = HEAD.size
+SAMPLE_OFFSET = HEAD_SIZE
+SUB_DEV_OFFSET = HEAD_SIZE + SAMPLE_PREFIX.size
+SUB_DEV_SIZE = SUB_DEV.size
+
+
+class ApolloFrame:
+    """A decoded sample data frame.
+
+    Channel values are stored in flat arrays: slot 0 is the main channel and
+    slot ``1 + sub_index * CHANNELS_PER_SUB_DEV + channel`` is a sub-device
+    channel.
+    """
+
+    __slots__ = (
+        "version",
+        "crc",
+        "type",
+        "length",
+        "timestamp",
+        "sub_dev_num",
+        "numbers",
+        "power",
+        "energy",
+    )
+
+    def __init__(
+        self,
+        version: int,
+        crc: int,
+        type_: int,
+        length: int,
+        timestamp: int,
+        numbers: bytes,
+        power: array,
+        energy: array,
+    ) -> None:
+        self.version = version
+        self.crc = crc
+        self.type = type_
+        self.length = length
+        self.timestamp = timestamp
+        self.sub_dev_num = len(numbers)
+        self.numbers = numbers
+        self.power = power
+        self.energy = energy
+
+    @property
+    def slot_count(self) -> int:
+        """Return the number of channel slots carried by the frame."""
+        return len(self.power)
+
+    def as_dict(self) -> dict:
+        """Return the frame in the layout of the device documentation."""
+        sub_dev_ch_data = []
+        for ind, number in enumerate(self.numbers):
+            base = 1 + ind * CHANNELS_PER_SUB_DEV
+            sub_dev_ch_data.append({
+                "number": number,
+                "chDatas": [
+                    {"Power": self.power[slot], "Energy": self.energy[slot]}
+                    for slot in range(base, base + CHANNELS_PER_SUB_DEV)
+                ],
+            })
+        return {
+            "apolloWsPkgHead": {
+                "version": self.version,
+                "crc": self.crc,
+                "type": self.type,
+                "length": self.length,
+            },
+            "sampleDataWsPayload": {
+                "timeStamp": self.timestamp,
+                "subDevNum": self.sub_dev_num,
+                "mainChData": {"Power": self.power[0], "Energy": self.energy[0]},
+                "subDevChData": sub_dev_ch_data,
+            },
+        }
+
+
+def sub_dev_slot(sub_index: int, channel: int) -> int:
+    """Return the frame slot of a sub-device channel."""
+    return 1 + sub_index * CHANNELS_PER_SUB_DEV + channel
+
+
+def channel_name(slot: int) -> str:
+    """Return the sensor name prefix of a frame slot."""
+    if slot == 0:
+        return "main"
+    ind, ch_ind = divmod(slot - 1, CHANNELS_PER_SUB_DEV)
+    return "sub_" + str(ind) + "-channel_" + str(ch_ind + 1)
+
+
+def channel_slot(name: str) -> int:
+    """Return the frame slot of a channel name, the inverse of channel_name."""
+    if name == "main":
+        return 0
+    sub, sep, channel = name.partition("-channel_")
+    if sep and sub.startswith("sub_") and sub[4:].isdigit() and channel.isdigit():
+        ch_ind = int(channel) - 1
+        if 0 <= ch_ind < CHANNELS_PER_SUB_DEV:
+            return sub_dev_slot(int(sub[4:]), ch_ind)
+    raise ValueError(f"Unknown channel {name}")
+
+
+def decode_sample(
+    view: memoryview, version: int, crc: int, type_: int, length: int
+) -> ApolloFrame | None:
+    """Decode the sample data payload of a packet whose header is parsed.
+
+    Returns None for a truncated packet: the buffer is shorter than the
+    length field, or the length field cannot hold ``subDevNum`` records.
+    A shorter frame would otherwise look like a change of channel layout.
+    """
+    if len(view) < max(HEAD_SIZE + length, SUB_DEV_OFFSET):
+        return None
+    timestamp, count, main_power, main_energy = SAMPLE_PREFIX.unpack_from(
+        view, SAMPLE_OFFSET
+    )
+    if SAMPLE_PREFIX.size + count * SUB_DEV_SIZE > length:
+        return None
+
+    power = array("i", (main_power,))
+    energy = array("I", (main_energy,))
+    numbers = bytearray(count)
+    if count:
+        records = view[SUB_DEV_OFFSET:SUB_DEV_OFFSET + count * SUB_DEV_SIZE]
+        for ind, record in enumerate(SUB_DEV.iter_unpack(records)):
+            numbers[ind] = record[0]
+            power.extend(record[1::2])
+            energy.extend(record[2::2])
+    return ApolloFrame(
+        version, crc, type_, length, timestamp, bytes(numbers), power, energy
+    )
+
+
+def decode_frame(data: bytes | bytearray | memoryview) -> ApolloFrame | None:
+    """Decode a binary websocket frame.
+
+    Returns None for packets that are not sample data or are truncated.
+    """
+    view = memoryview(data)
+    if len(view) < SUB_DEV_OFFSET:
+        return None
+    version, crc, type_, length = HEAD.unpack_from(view)
+    if type_ != PKG_TYPE_SAMPLE_DATA:
+        return None
+    return decode_sample(view, version, crc, type_, length)
+
+
+PacketDecoder = Callable[[memoryview, int, int, int, int], Any]
+
+
+class PacketRegistry:
+    """Decoders of the packet types a consumer handles, keyed by (version, type).
+
+    A decoder registered without a version handles every version of its
+    type that has no decoder of its own. Every packet is counted per
+    (version, type), for at most MAX_PACKET_KINDS kinds; further kinds
+    share one "other" counter so garbage headers cannot grow the counters.
+    Packets of other types are also counted as skipped, before their
+    payload is touched. With ``verify_crc`` the CRC-32 of the payload must match
+    the header; a zero crc field means the sender did not compute one and
+    is accepted.
+    """
+
+    def __init__(self, verify_crc: bool = False) -> None:
+        self.verify_crc = verify_crc
+        self._decoders: dict[tuple[int | None, int], PacketDecoder] = {}
+        # (version, type) -> decoder of the registered kinds seen so far
+        self._resolved: dict[tuple[int, int], PacketDecoder] = {}
+        self.counts: dict[tuple[int, int], int] = {}
+        self.other = 0
+        self.skipped = 0
+        self.crc_errors = 0
+        self.truncated = 0
+
+    def register(self, type_: int, decoder: PacketDecoder, version: int | None = None) -> None:
+        """Handle packets of a type, of one version or of any version."""
+        self._decoders[(version, type_)] = decoder
+        self._resolved.clear()
+
+    def _resolve(self, key: tuple[int, int]) -> PacketDecoder | None:
+        decoder = self._decoders.get(key)
+        if decoder is None:
+            decoder = self._decoders.get((None, key[1]))
+        if decoder is not None and len(self._resolved) < MAX_PACKET_KINDS:
+            _LOGGER.debug("First packet of version %s type %s, %s", *key, decoder.__name__)
+            self._resolved[key] = decoder
+        return decoder
+
+    def decode(self, data: bytes | bytearray | memoryview) -> Any:
+        """Decode a packet; None if it is skipped or invalid."""
+        view = memoryview(data)
+        if len(view) < HEAD_SIZE:
+            self.truncated += 1
+            return None
+        version, crc, type_, length = HEAD.unpack_from(view)
+        key = (version, type_)
+        # 跳过的类型也按类型计数, 显示设备实际发送的内容
+        counts = self.counts
+        if key in counts:
+            counts[key] += 1
+        elif len(counts) < MAX_PACKET_KINDS:
+            counts[key] = 1
+        else:
+            self.other += 1
+        try:
+            decoder = self._resolved[key]
+        except KeyError:
+            decoder = self._resolve(key)
+            if decoder is None:
+                self.skipped += 1
+                return None
+        if self.verify_crc and crc:
+            if len(view) < HEAD_SIZE + length:
+                self.truncated += 1
+                return None
+            if crc32(view[HEAD_SIZE:HEAD_SIZE + length]) != crc:
+                self.crc_errors += 1
+                return None
+        packet = decoder(view, version, crc, type_, length)
+        if packet is None:
+            self.truncated += 1
+        return packet
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the packet counters."""
+        return {
+            "types": {
+                f"v{version}/type{type_}": count
+                for (version, type_), count in sorted(self.counts.items())
+            },
+            "other": self.other,
+            "skipped": self.skipped,
+            "crc_errors": self.crc_errors,
+            "truncated": self.truncated,
+        }
+
+
+def sample_registry(verify_crc: bool = False) -> PacketRegistry:
+    """Return a registry that decodes sample data of every version."""
+    registry = PacketRegistry(verify_crc)
+    registry.register(PKG_TYPE_SAMPLE_DATA, decode_sample)
+    return registry
+
+
+class FrameStream:
+    """Split a byte stream of concatenated frames using the length field."""
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def feed(self, chunk: bytes) -> list[ApolloFrame]:
+        """Add a chunk and return the sample data frames it completed."""
+        buffer = self._buffer
+        buffer += chunk
+        frames = []
+        offset = 0
+        with memoryview(buffer) as view:
+            while len(view) - offset >= HEAD_SIZE:
+                length = HEAD.unpack_from(view, offset)[3]
+                if length > MAX_FRAME_LENGTH:
+                    raise ValueError(f"Corrupt frame stream, length {length}")
+                end = offset + HEAD_SIZE + length
+                if end > len(view):
+                    break
+                frame = decode_frame(view[offset:end])
+                if frame is not None:
+                    frames.append(frame)
+                offset = end
+        del buffer[:offset]
+        return frames
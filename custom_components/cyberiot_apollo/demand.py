@@ -0,0 +1,44 @@
+"""Track whether anything consumes the realtime frames of a device."""
+from __future__ import annotations
+
+from collections.abc import Callable
+
+from homeassistant.core import CALLBACK_TYPE, callback
+
+
+class RealtimeDemand:
+    """Reference count of realtime consumers.
+
+    Enabled channel entities, live and stream subscribers and frame capture
+    each hold a reference while they need frames. ``on_change`` is called
+    when the count moves between zero and non-zero.
+    """
+
+    def __init__(self, on_change: Callable[[bool], None]) -> None:
+        self._on_change = on_change
+        self.count = 0
+
+    @property
+    def active(self) -> bool:
+        """Return True while anything needs realtime frames."""
+        return self.count > 0
+
+    @callback
+    def async_acquire(self) -> CALLBACK_TYPE:
+        """Register a consumer; return the callback that releases it."""
+        self.count += 1
+        if self.count == 1:
+            self._on_change(True)
+        released = False
+
+        @callback
+        def release() -> None:
+            nonlocal released
+            if released:
+                return
+            released = True
+            self.count -= 1
+            if not self.count:
+                self._on_change(False)
+
+        return release
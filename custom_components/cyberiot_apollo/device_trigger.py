@@ -0,0 +1,123 @@
+"""Device triggers on the power of a single channel.
+
+The triggers are fed by threshold watches evaluated as frames are decoded,
+not by entity states, so they fire within one frame even for channels
+whose sensors are disabled or throttled by the write policy.
+"""
+from __future__ import annotations
+
+import voluptuous as vol
+
+from homeassistant.components.device_automation import (
+    DEVICE_TRIGGER_BASE_SCHEMA,
+    InvalidDeviceAutomationConfig,
+)
+from homeassistant.const import CONF_DEVICE_ID, CONF_DOMAIN, CONF_PLATFORM, CONF_TYPE
+from homeassistant.core import CALLBACK_TYPE, HassJob, HomeAssistant, callback
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.trigger import TriggerActionType, TriggerInfo
+from homeassistant.helpers.typing import ConfigType
+
+from .const import DOMAIN
+from .decoder import channel_slot
+from .threshold import async_track_channel_threshold
+
+TRIGGER_POWER_ABOVE = "power_above"
+TRIGGER_POWER_BELOW = "power_below"
+TRIGGER_TYPES = (TRIGGER_POWER_ABOVE, TRIGGER_POWER_BELOW)
+
+CONF_CHANNEL = "channel"
+CONF_THRESHOLD = "threshold"
+CONF_HYSTERESIS = "hysteresis"
+
+
+def _channel(value: str) -> str:
+    try:
+        channel_slot(value)
+    except ValueError as err:
+        raise vol.Invalid(str(err)) from err
+    return value
+
+
+EXTRA_FIELDS = {
+    vol.Required(CONF_CHANNEL, default="main"): vol.All(str, _channel),
+    vol.Required(CONF_THRESHOLD): vol.Coerce(float),
+    vol.Optional(CONF_HYSTERESIS, default=0.0): vol.All(vol.Coerce(float), vol.Range(min=0)),
+}
+
+TRIGGER_SCHEMA = DEVICE_TRIGGER_BASE_SCHEMA.extend(
+    {vol.Required(CONF_TYPE): vol.In(TRIGGER_TYPES), **EXTRA_FIELDS}
+)
+
+
+async def async_get_triggers(hass: HomeAssistant, device_id: str) -> list[dict[str, str]]:
+    """List the triggers of an Apollo device."""
+    return [
+        {
+            CONF_PLATFORM: "device",
+            CONF_DOMAIN: DOMAIN,
+            CONF_DEVICE_ID: device_id,
+            CONF_TYPE: trigger_type,
+        }
+        for trigger_type in TRIGGER_TYPES
+    ]
+
+
+async def async_get_trigger_capabilities(
+    hass: HomeAssistant, config: ConfigType
+) -> dict[str, vol.Schema]:
+    """Ask for the channel, threshold and hysteresis."""
+    return {"extra_fields": vol.Schema(EXTRA_FIELDS)}
+
+
+@callback
+def _async_entry_id(hass: HomeAssistant, device_id: str) -> str:
+    device = dr.async_get(hass).async_get(device_id)
+    if device is not None:
+        for entry_id in device.config_entries:
+            entry = hass.config_entries.async_get_entry(entry_id)
+            if entry is not None and entry.domain == DOMAIN:
+                return entry_id
+    raise InvalidDeviceAutomationConfig(f"No Apollo device {device_id}")
+
+
+async def async_attach_trigger(
+    hass: HomeAssistant,
+    config: ConfigType,
+    action: TriggerActionType,
+    trigger_info: TriggerInfo,
+) -> CALLBACK_TYPE:
+    """Run the action each time the channel crosses the threshold in the chosen direction."""
+    entry_id = _async_entry_id(hass, config[CONF_DEVICE_ID])
+    trigger_type = config[CONF_TYPE]
+    threshold = config[CONF_THRESHOLD]
+    wanted = trigger_type == TRIGGER_POWER_ABOVE
+    job = HassJob(action, f"{DOMAIN} {trigger_type} trigger")
+    trigger_data = trigger_info["trigger_data"]
+
+    @callback
+    def crossed(channel: str, power: int, above: bool, timestamp: int) -> None:
+        if above is not wanted:
+            return
+        hass.async_run_hass_job(
+            job,
+            {
+                "trigger": {
+                    **trigger_data,
+                    CONF_PLATFORM: "device",
+                    CONF_DOMAIN: DOMAIN,
+                    CONF_DEVICE_ID: config[CONF_DEVICE_ID],
+                    CONF_TYPE: trigger_type,
+                    CONF_CHANNEL: channel,
+                    CONF_THRESHOLD: threshold,
+                    "power": power,
+                    "timestamp": timestamp,
+                    "description": f"{channel} power {'above' if above else 'below'} "
+                    f"{threshold} W",
+                }
+            },
+        )
+
+    return async_track_channel_threshold(
+        hass, entry_id, config[CONF_CHANNEL], threshold, crossed, config[CONF_HYSTERESIS]
+    )
@@ -0,0 +1,46 @@
+"""Diagnostics support for Cyberiot Apollo."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.const import CONF_HOST
+from homeassistant.core import HomeAssistant
+
+from . import ApolloConfigEntry
+from .hub import async_get_hub
+
+TO_REDACT = {CONF_HOST}
+# Number of busiest channel sensors listed in the download
+TOP_WRITERS = 20
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ApolloConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    apollo = entry.runtime_data
+    diagnostics: dict[str, Any] = {
+        "entry": {
+            "data": async_redact_data(entry.data, TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "endpoint_cached": apollo.resolver.endpoint is not None,
+        "round_trips": apollo.session.as_dict(),
+    }
+    hub = async_get_hub(hass)
+    # 所有设备共用 hub, 一个设备的问题 (如重连风暴) 常常要和其它设备对照
+    diagnostics["hub"] = {"timers": len(hub.wheel), "devices": hub.health()}
+    manager = hub.get_device(entry.entry_id)
+    if manager is None:
+        return diagnostics
+    diagnostics["health"] = manager.health()
+    diagnostics["state_writes"] = manager.state_writes()
+    diagnostics["metrics"] = manager.metrics.as_dict() if manager.metrics else None
+    writers = sorted(
+        manager.sensors.items(), key=lambda item: item[1].writes, reverse=True
+    )
+    diagnostics["busiest_sensors"] = {
+        name: sensor.writes for name, sensor in writers[:TOP_WRITERS]
+    }
+    return diagnostics
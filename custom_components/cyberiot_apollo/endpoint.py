@@ -0,0 +1,137 @@
+"""Concurrent endpoint resolution for Apollo devices."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Sequence
+import logging
+import time
+
+import aiohttp
+
+from .session import ApolloSession
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300.0
+DEFAULT_STAGGER = 0.25
+DEFAULT_PROBE_TIMEOUT = 2.0
+
+PROBE_URL = "http://{}/system-info"
+
+
+class EndpointUnreachable(aiohttp.ClientConnectionError):
+    """Error to indicate no candidate endpoint answered."""
+
+
+class EndpointResolver:
+    """Race the candidate addresses of a device and cache the winner.
+
+    Candidates are probed happy-eyeballs style: each one starts a short
+    stagger after the previous one (or immediately once all earlier probes
+    have failed) and the first healthy answer wins.
+    """
+
+    def __init__(
+        self,
+        session: ApolloSession,
+        candidates: Sequence[str],
+        ttl: float = DEFAULT_TTL,
+        stagger: float = DEFAULT_STAGGER,
+        probe_timeout: float = DEFAULT_PROBE_TIMEOUT,
+    ) -> None:
+        self._session = session
+        self.candidates = tuple(dict.fromkeys(candidates))
+        self.ttl = ttl
+        self.stagger = stagger
+        self.probe_timeout = probe_timeout
+        self._endpoint: str | None = None
+        self._expires = 0.0
+        self._inflight: asyncio.Future[str] | None = None
+
+    @property
+    def endpoint(self) -> str | None:
+        """Return the cached endpoint if it is still fresh."""
+        if self._endpoint is not None and time.monotonic() < self._expires:
+            return self._endpoint
+        return None
+
+    def prime(self, endpoint: str) -> None:
+        """Use a previously working endpoint without probing it first."""
+        if endpoint in self.candidates:
+            self._endpoint = endpoint
+            self._expires = time.monotonic() + self.ttl
+
+    def invalidate(self, endpoint: str | None = None) -> None:
+        """Forget the cached endpoint, optionally only if it matches."""
+        if endpoint is None or endpoint == self._endpoint:
+            self._endpoint = None
+            self._expires = 0.0
+
+    async def async_resolve(self) -> str:
+        """Return a reachable endpoint, racing the candidates if needed."""
+        if (endpoint := self.endpoint) is not None:
+            return endpoint
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._race())
+            self._inflight.add_done_callback(self._clear_inflight)
+        return await asyncio.shield(self._inflight)
+
+    def cancel(self) -> None:
+        """Abort a resolution that is still running."""
+        if self._inflight is not None:
+            self._inflight.cancel()
+
+    def _clear_inflight(self, _: asyncio.Future[str]) -> None:
+        self._inflight = None
+
+    async def _race(self) -> str:
+        tasks: list[asyncio.Task[str | None]] = []
+        try:
+            winner = None
+            for address in self.candidates:
+                tasks.append(asyncio.create_task(self._probe(address)))
+                if (winner := await self._first_healthy(tasks, self.stagger)):
+                    break
+            else:
+                winner = await self._first_healthy(tasks, None)
+        finally:
+            for task in tasks:
+                task.cancel()
+        if not winner:
+            raise EndpointUnreachable(
+                f"No reachable endpoint among {', '.join(self.candidates)}"
+            )
+        _LOGGER.debug("Resolved endpoint %s", winner)
+        self._endpoint = winner
+        self._expires = time.monotonic() + self.ttl
+        return winner
+
+    @staticmethod
+    async def _first_healthy(
+        tasks: list[asyncio.Task[str | None]], timeout: float | None
+    ) -> str | None:
+        """Wait for a successful probe; None on timeout or if all failed."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.result():
+                    return task.result()
+            pending = [task for task in tasks if not task.done()]
+            if not pending:
+                return None
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            done, _ = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                return None
+
+    async def _probe(self, address: str) -> str | None:
+        try:
+            async with asyncio.timeout(self.probe_timeout):
+                body = await self._session.get(PROBE_URL.format(address), "probe")
+        except (aiohttp.ClientError, TimeoutError, OSError):
+            return None
+        return address if body is not None else None
@@ -0,0 +1,79 @@
+"""Re-publish a device's stream to local subscribers.
+
+Other tools connect to Home Assistant instead of the device, so the device
+keeps a single client however many consumers there are.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from homeassistant.core import callback
+
+from .frame_queue import FrameQueue
+
+
+class StreamSubscriber:
+    """One local client with its own bounded queue.
+
+    A client that cannot keep up loses frames according to its queue
+    policy; it never slows the device connection or other clients down.
+    """
+
+    __slots__ = ("queue", "raw", "sent")
+
+    def __init__(self, raw: bool, maxsize: int, policy: str) -> None:
+        self.queue = FrameQueue(maxsize, policy)
+        self.raw = raw
+        self.sent = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the delivery counters."""
+        return {"format": "raw" if self.raw else "json", "sent": self.sent, **self.queue.as_dict()}
+
+
+class StreamFanout:
+    """Distribute the stream of one device to its subscribers."""
+
+    def __init__(self) -> None:
+        self.raw: list[StreamSubscriber] = []
+        self.decoded: list[StreamSubscriber] = []
+        self.closed = False
+
+    @callback
+    def async_subscribe(self, subscriber: StreamSubscriber):
+        """Add a subscriber; return the callback that removes it."""
+        subscribers = self.raw if subscriber.raw else self.decoded
+        subscribers.append(subscriber)
+        if self.closed:
+            subscriber.queue.put_nowait(None)
+
+        @callback
+        def remove() -> None:
+            subscribers.remove(subscriber)
+
+        return remove
+
+    def publish_raw(self, data: bytes) -> None:
+        """Queue a frame as received for every raw subscriber."""
+        for subscriber in self.raw:
+            subscriber.queue.put_nowait(data)
+
+    def publish_decoded(self, message: dict[str, Any]) -> None:
+        """Queue decoded values for every json subscriber, serialized once."""
+        if self.decoded:
+            text = json.dumps(message, separators=(",", ":"))
+            for subscriber in self.decoded:
+                subscriber.queue.put_nowait(text)
+
+    @callback
+    def async_close(self) -> None:
+        """End every subscription, the device connection is going away."""
+        self.closed = True
+        for subscriber in (*self.raw, *self.decoded):
+            subscriber.queue.clear()
+            subscriber.queue.put_nowait(None)
+
+    def as_dict(self) -> list[dict[str, Any]]:
+        """Return the counters of every subscriber."""
+        return [subscriber.as_dict() for subscriber in (*self.raw, *self.decoded)]
@@ -0,0 +1,75 @@
+"""Bounded hand-off between the websocket receive and dispatch stages."""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from typing import Any
+
+POLICY_LATEST = "latest"
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICIES = (POLICY_LATEST, POLICY_DROP_OLDEST)
+
+
+class FrameQueue:
+    """Bounded queue that never blocks the producer.
+
+    With ``latest`` the consumer always gets the newest frame and every
+    older frame still waiting is dropped. With ``drop_oldest`` frames are
+    delivered in order and the oldest one is dropped when the queue is full.
+    """
+
+    def __init__(self, maxsize: int, policy: str = POLICY_LATEST) -> None:
+        self._items: deque[Any] = deque()
+        self._ready = asyncio.Event()
+        self.maxsize = maxsize
+        self.policy = policy
+        self.drops = 0
+        self.max_depth = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def configure(self, maxsize: int, policy: str) -> None:
+        """Change size and overflow policy, dropping what no longer fits."""
+        self.maxsize = maxsize
+        self.policy = policy
+        limit = 1 if policy == POLICY_LATEST else maxsize
+        while len(self._items) > limit:
+            self._items.popleft()
+            self.drops += 1
+
+    def put_nowait(self, item: Any) -> None:
+        """Queue an item, dropping older ones according to the policy."""
+        items = self._items
+        if items and (self.policy == POLICY_LATEST or len(items) >= self.maxsize):
+            if self.policy == POLICY_LATEST:
+                self.drops += len(items)
+                items.clear()
+            else:
+                items.popleft()
+                self.drops += 1
+        items.append(item)
+        if len(items) > self.max_depth:
+            self.max_depth = len(items)
+        self._ready.set()
+
+    async def get(self) -> Any:
+        """Wait for and return the next item."""
+        while not self._items:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._items.popleft()
+
+    def clear(self) -> None:
+        """Drop everything still queued, without counting it as overflow."""
+        self._items.clear()
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return depth and drop counters."""
+        return {
+            "policy": self.policy,
+            "maxsize": self.maxsize,
+            "depth": len(self._items),
+            "max_depth": self.max_depth,
+            "drops": self.drops,
+        }
@@ -0,0 +1,285 @@
+"""Domain-level hub that owns all Apollo device connections."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+import logging
+import random
+import time
+from typing import Any, Protocol
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+WHEEL_TICK = 0.25
+WHEEL_SLOTS = 256
+HEARTBEAT_INTERVAL = 10.0
+# How often every connection is checked for stalled streams
+WATCHDOG_INTERVAL = 0.5
+# Minimum spacing between two reconnect attempts across all devices
+RECONNECT_SPACING = 0.5
+# Seconds a device gets to tear its connection down on unload
+SHUTDOWN_TIMEOUT = 10.0
+BACKOFF_BASE = 0.25
+BACKOFF_CAP = 30.0
+
+
+class ApolloConnection(Protocol):
+    """What the hub needs from a device connection."""
+
+    def health(self) -> dict[str, Any]: ...
+
+    async def start(self) -> None: ...
+
+    @callback
+    def async_heartbeat(self) -> None: ...
+
+    @callback
+    def async_check_liveness(self, now: float) -> None: ...
+
+    async def async_shutdown(self) -> None: ...
+
+
+class ExponentialBackoff:
+    """Reconnect delays that double per failed attempt, with jitter.
+
+    Each delay is drawn from the upper half of the current step, so the
+    first retry is sub-second and devices that failed together drift apart.
+    """
+
+    def __init__(self, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP) -> None:
+        self.base = base
+        self.cap = cap
+        self.attempt = 0
+
+    def reset(self) -> None:
+        """Start over after a healthy connection."""
+        self.attempt = 0
+
+    def next_delay(self) -> float:
+        """Return the delay before the next attempt."""
+        step = min(self.cap, self.base * 2 ** min(self.attempt, 16))
+        self.attempt += 1
+        return random.uniform(step / 2, step)
+
+
+def _cancelled() -> None:
+    """Callback of a cancelled timer."""
+
+
+class Timer:
+    """Handle of a callback scheduled on the timer wheel."""
+
+    __slots__ = ("callback", "interval", "rounds", "cancelled")
+
+    def __init__(self, callback: Callable[[], None], interval: float | None) -> None:
+        self.callback = callback
+        self.interval = interval
+        self.rounds = 0
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        """Cancel the timer.
+
+        The timer stays in its wheel slot until the slot comes round again;
+        dropping the callback now releases what it references.
+        """
+        self.cancelled = True
+        self.callback = _cancelled
+
+
+class TimerWheel:
+    """Hashed timer wheel driven by a single loop timer.
+
+    Every heartbeat and reconnect delay of the domain lives here, so the
+    event loop only ever has one pending timer for all devices. The tick
+    stops while the wheel is empty.
+    """
+
+    def __init__(self, hass: HomeAssistant, tick: float = WHEEL_TICK, slots: int = WHEEL_SLOTS) -> None:
+        self._hass = hass
+        self.tick = tick
+        self._slots: list[list[Timer]] = [[] for _ in range(slots)]
+        self._position = 0
+        self._count = 0
+        self._handle: asyncio.TimerHandle | None = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _insert(self, timer: Timer, delay: float) -> None:
+        ticks = max(1, round(delay / self.tick))
+        timer.rounds, offset = divmod(ticks, len(self._slots))
+        if offset == 0:
+            timer.rounds -= 1
+        self._slots[(self._position + offset) % len(self._slots)].append(timer)
+        self._count += 1
+        if self._handle is None:
+            self._handle = self._hass.loop.call_later(self.tick, self._advance)
+
+    @callback
+    def schedule(self, delay: float, callback: Callable[[], None]) -> Timer:
+        """Run callback once after delay seconds."""
+        timer = Timer(callback, None)
+        self._insert(timer, delay)
+        return timer
+
+    @callback
+    def schedule_repeating(
+        self, interval: float, callback: Callable[[], None], first: float | None = None
+    ) -> Timer:
+        """Run callback every interval seconds, the first time after first."""
+        timer = Timer(callback, interval)
+        self._insert(timer, interval if first is None else first)
+        return timer
+
+    @callback
+    def _advance(self) -> None:
+        self._position = (self._position + 1) % len(self._slots)
+        slot = self._slots[self._position]
+        due: list[Timer] = []
+        keep: list[Timer] = []
+        for timer in slot:
+            if timer.cancelled:
+                self._count -= 1
+            elif timer.rounds:
+                timer.rounds -= 1
+                keep.append(timer)
+            else:
+                self._count -= 1
+                due.append(timer)
+        self._slots[self._position] = keep
+        for timer in due:
+            if timer.interval is not None:
+                self._insert(timer, timer.interval)
+            try:
+                timer.callback()
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error in timer callback")
+        self._handle = (
+            self._hass.loop.call_later(self.tick, self._advance) if self._count else None
+        )
+
+    @callback
+    def stop(self) -> None:
+        """Drop every timer and stop ticking."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        for slot in self._slots:
+            slot.clear()
+        self._count = 0
+
+
+class ApolloHub:
+    """Own the connection tasks of every configured Apollo device.
+
+    Heartbeats and reconnect delays share one timer wheel, and reconnects
+    of all devices are spaced out so a router reboot does not turn into a
+    reconnect storm.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self.wheel = TimerWheel(hass)
+        self._devices: dict[str, ApolloConnection] = {}
+        self._tasks: dict[str, asyncio.Task[None]] = {}
+        self._heartbeats: dict[str, Timer] = {}
+        self._watchdog: Timer | None = None
+        self._next_reconnect = 0.0
+
+    @callback
+    def async_add_device(self, key: str, connection: ApolloConnection) -> None:
+        """Start the connection task of a device."""
+        if key in self._devices:
+            raise ValueError(f"Device {key} is already connected")
+        self._devices[key] = connection
+        self._tasks[key] = self._hass.async_create_background_task(
+            connection.start(), f"{DOMAIN} connection {key}"
+        )
+        if self._watchdog is None:
+            self._watchdog = self.wheel.schedule_repeating(
+                WATCHDOG_INTERVAL, self._async_watchdog
+            )
+
+    async def async_remove_device(self, key: str) -> None:
+        """Stop the connection of a device and wait until it is torn down."""
+        connection = self._devices.pop(key, None)
+        self.async_stop_heartbeat(key)
+        if not self._devices:
+            self._watchdog = None
+            self.wheel.stop()
+        if (task := self._tasks.pop(key, None)) is not None:
+            task.cancel()
+            await asyncio.wait((task,), timeout=SHUTDOWN_TIMEOUT)
+        if connection is not None:
+            try:
+                async with asyncio.timeout(SHUTDOWN_TIMEOUT):
+                    await connection.async_shutdown()
+            except TimeoutError:
+                _LOGGER.warning("Timed out shutting down the connection of %s", key)
+
+    @callback
+    def _async_watchdog(self) -> None:
+        now = time.monotonic()
+        for connection in self._devices.values():
+            connection.async_check_liveness(now)
+
+    @callback
+    def async_start_heartbeat(self, key: str) -> None:
+        """Ping a connected device every HEARTBEAT_INTERVAL seconds."""
+        self.async_stop_heartbeat(key)
+        if (connection := self._devices.get(key)) is None:
+            return
+        # 随机错开各设备的心跳, 避免同一时刻发送
+        self._heartbeats[key] = self.wheel.schedule_repeating(
+            HEARTBEAT_INTERVAL,
+            connection.async_heartbeat,
+            first=random.uniform(self.wheel.tick, HEARTBEAT_INTERVAL),
+        )
+
+    @callback
+    def async_stop_heartbeat(self, key: str) -> None:
+        """Stop pinging a device."""
+        if (timer := self._heartbeats.pop(key, None)) is not None:
+            timer.cancel()
+
+    async def async_wait_reconnect(self, delay: float) -> None:
+        """Sleep before a reconnect attempt.
+
+        The attempt is pushed back so that attempts of all devices are at
+        least RECONNECT_SPACING apart.
+        """
+        now = time.monotonic()
+        at = max(now + delay, self._next_reconnect + RECONNECT_SPACING)
+        self._next_reconnect = at
+        future: asyncio.Future[None] = self._hass.loop.create_future()
+
+        def _wake() -> None:
+            if not future.done():
+                future.set_result(None)
+
+        timer = self.wheel.schedule(at - now, _wake)
+        try:
+            await future
+        finally:
+            timer.cancel()
+
+    def get_device(self, key: str) -> ApolloConnection | None:
+        """Return the connection of a config entry."""
+        return self._devices.get(key)
+
+    def health(self) -> dict[str, dict[str, Any]]:
+        """Return the health of every device, keyed by config entry."""
+        return {key: connection.health() for key, connection in self._devices.items()}
+
+
+@callback
+def async_get_hub(hass: HomeAssistant) -> ApolloHub:
+    """Return the hub of the domain, creating it on first use."""
+    if (hub := hass.data.get(DOMAIN)) is None:
+        hub = hass.data[DOMAIN] = ApolloHub(hass)
+    return hub
@@ -0,0 +1,131 @@
+"""Live streams of the device frames for dashboards and local tools.
+
+Frames are forwarded as they are decoded and never touch the state
+machine, so the recorder does not see them.
+
+- ``cyberiot_apollo/live/subscribe`` on the Home Assistant websocket API
+  sends the decoded values, for dashboards. The subscription ends with a
+  ``not_found`` error when the device connection is unloaded or reloaded,
+  so the dashboard can subscribe again.
+- ``/api/cyberiot_apollo/<entry_id>/stream`` is a plain websocket for
+  other tools. ``format=raw`` (the default) forwards frames byte for byte
+  as the device sent them, ``format=json`` sends the decoded values.
+"""
+from __future__ import annotations
+
+from http import HTTPStatus
+from typing import Any
+
+from aiohttp import WSMsgType, web
+import voluptuous as vol
+
+from homeassistant.components import websocket_api
+from homeassistant.components.http import KEY_HASS, HomeAssistantView
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DOMAIN
+from .fanout import StreamSubscriber
+from .frame_queue import POLICIES, POLICY_DROP_OLDEST
+from .hub import async_get_hub
+
+SUBSCRIBER_QUEUE_SIZE = 64
+MAX_SUBSCRIBER_QUEUE_SIZE = 1024
+STREAM_HEARTBEAT = 30.0
+
+
+@callback
+def async_setup_live(hass: HomeAssistant) -> None:
+    """Register the websocket commands."""
+    websocket_api.async_register_command(hass, ws_subscribe_live)
+    hass.http.register_view(ApolloStreamView())
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): f"{DOMAIN}/live/subscribe",
+        vol.Required("entry_id"): str,
+    }
+)
+@callback
+def ws_subscribe_live(
+    hass: HomeAssistant,
+    connection: websocket_api.ActiveConnection,
+    msg: dict[str, Any],
+) -> None:
+    """Subscribe to the decoded frames of a device."""
+    manager = async_get_hub(hass).get_device(msg["entry_id"])
+    if manager is None:
+        connection.send_error(msg["id"], websocket_api.ERR_NOT_FOUND, "Device not connected")
+        return
+
+    @callback
+    def forward(message: dict[str, Any]) -> None:
+        connection.send_message(websocket_api.event_message(msg["id"], message))
+
+    @callback
+    def closed() -> None:
+        if (unsubscribe := connection.subscriptions.pop(msg["id"], None)) is not None:
+            unsubscribe()
+        connection.send_error(msg["id"], websocket_api.ERR_NOT_FOUND, "Device connection closed")
+
+    connection.subscriptions[msg["id"]] = manager.async_subscribe_live(forward, closed)
+    connection.send_result(msg["id"])
+
+
+class ApolloStreamView(HomeAssistantView):
+    """Websocket endpoint streaming the frames of a config entry."""
+
+    url = f"/api/{DOMAIN}/{{entry_id}}/stream"
+    name = f"api:{DOMAIN}:stream"
+
+    async def get(self, request: web.Request, entry_id: str) -> web.StreamResponse:
+        """Stream frames until the client or the device connection goes away.
+
+        Query parameters: ``format`` (raw or json), ``policy`` (latest or
+        drop_oldest) and ``queue_size``.
+        """
+        hass = request.app[KEY_HASS]
+        manager = async_get_hub(hass).get_device(entry_id)
+        if manager is None:
+            return self.json_message("Device not connected", HTTPStatus.NOT_FOUND)
+        query = request.query
+        fmt = query.get("format", "raw")
+        policy = query.get("policy", POLICY_DROP_OLDEST)
+        try:
+            maxsize = int(query.get("queue_size", SUBSCRIBER_QUEUE_SIZE))
+        except ValueError:
+            maxsize = 0
+        if fmt not in ("raw", "json") or policy not in POLICIES or not (
+            0 < maxsize <= MAX_SUBSCRIBER_QUEUE_SIZE
+        ):
+            return self.json_message("Invalid stream parameters", HTTPStatus.BAD_REQUEST)
+
+        ws = web.WebSocketResponse(heartbeat=STREAM_HEARTBEAT)
+        await ws.prepare(request)
+        subscriber = StreamSubscriber(fmt == "raw", maxsize, policy)
+        unsubscribe = manager.async_subscribe_stream(subscriber)
+        sender = hass.async_create_background_task(
+            self._send(ws, subscriber), f"{DOMAIN} stream {entry_id}"
+        )
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR:
+                    break
+        finally:
+            unsubscribe()
+            sender.cancel()
+        return ws
+
+    @staticmethod
+    async def _send(ws: web.WebSocketResponse, subscriber: StreamSubscriber) -> None:
+        queue = subscriber.queue
+        try:
+            while (item := await queue.get()) is not None:
+                if subscriber.raw:
+                    await ws.send_bytes(item)
+                else:
+                    await ws.send_str(item)
+                subscriber.sent += 1
+        except ConnectionResetError:
+            return
+        await ws.close()
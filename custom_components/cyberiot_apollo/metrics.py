@@ -0,0 +1,71 @@
+"""Runtime instrumentation of the websocket pipeline."""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from typing import Any
+
+# Upper bucket bounds in nanoseconds: 1 us doubling up to ~1 s
+_BOUNDS = tuple(1000 << shift for shift in range(21))
+
+
+class LatencyHistogram:
+    """Fixed log2-bucket latency histogram."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.counts = array("Q", bytes(8 * (len(_BOUNDS) + 1)))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, nanoseconds: int) -> None:
+        """Record one sample."""
+        self.counts[bisect_left(_BOUNDS, nanoseconds)] += 1
+        self.count += 1
+        self.total += nanoseconds
+        if nanoseconds > self.max:
+            self.max = nanoseconds
+
+    def percentile(self, pct: float) -> float | None:
+        """Return the upper bound in microseconds of the bucket holding pct."""
+        if not self.count:
+            return None
+        rank = self.count * pct / 100
+        seen = 0
+        for index, bucket in enumerate(self.counts):
+            seen += bucket
+            if seen >= rank:
+                bound = _BOUNDS[index] if index < len(_BOUNDS) else self.max
+                return min(bound, self.max) / 1000
+        return self.max / 1000
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return a summary in microseconds."""
+        return {
+            "count": self.count,
+            "mean_us": round(self.total / self.count / 1000, 2) if self.count else None,
+            "p50_us": self.percentile(50),
+            "p95_us": self.percentile(95),
+            "p99_us": self.percentile(99),
+            "max_us": self.max / 1000,
+        }
+
+
+class PipelineMetrics:
+    """Latency histograms of the decode and dispatch stages.
+
+    Only allocated when metrics are enabled; the hot path checks for None
+    once per frame.
+    """
+
+    __slots__ = ("decode", "dispatch")
+
+    def __init__(self) -> None:
+        self.decode = LatencyHistogram()
+        self.dispatch = LatencyHistogram()
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the histograms as a summary."""
+        return {"decode": self.decode.as_dict(), "dispatch": self.dispatch.as_dict()}
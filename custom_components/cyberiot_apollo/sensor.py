@@ -2,21 +2,77 @@
 import aiohttp
 import asyncio
 import logging
-import struct
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
 
 from homeassistant.components.sensor import (
+    RestoreSensor,
     SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
 )
-from homeassistant.const import UnitOfPower
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.entity import Entity
+from homeassistant.const import EntityCategory, UnitOfEnergy, UnitOfPower, UnitOfTime
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_track_time_interval
 
 from . import ApolloConfigEntry
-from .const import DOMAIN
+from .aggregation import Downsampler, FrameAggregator
+from .backfill import ApolloBackfill
+from .capture import CaptureWriter, FrameCapture
+from .const import (
+    CONF_AVERAGE_WINDOW,
+    CONF_CAPTURE,
+    CONF_DEMAND_WINDOW,
+    CONF_DOWNSAMPLE_WINDOW,
+    CONF_IDLE_HOURS,
+    CONF_METRICS,
+    CONF_QUEUE_POLICY,
+    CONF_QUEUE_SIZE,
+    CONF_TRACK_ACTIVITY,
+    CONF_VERIFY_CRC,
+    DEFAULT_AVERAGE_WINDOW,
+    DEFAULT_CAPTURE,
+    DEFAULT_DEMAND_WINDOW,
+    DEFAULT_DOWNSAMPLE_WINDOW,
+    DEFAULT_IDLE_HOURS,
+    DEFAULT_QUEUE_POLICY,
+    DEFAULT_QUEUE_SIZE,
+    DEFAULT_TRACK_ACTIVITY,
+    DEFAULT_VERIFY_CRC,
+    DOMAIN,
+)
+from .decoder import channel_name, sample_registry
+from .demand import RealtimeDemand
+from .fanout import StreamFanout
+from .frame_queue import FrameQueue
+from .hub import ExponentialBackoff, async_get_hub
+from .metrics import PipelineMetrics
+from .storage import ApolloStore
+from .threshold import ChannelWatches, async_get_watches
+from .write_policy import WritePolicy
 
 _LOGGER = logging.getLogger(__name__)
 
+BACKFILL_INTERVAL = timedelta(hours=1)
+# Stall detection of the websocket stream
+STALL_FACTOR = 3
+MIN_STALL_TIMEOUT = 1.0
+FIRST_FRAME_TIMEOUT = 10.0
+PONG_TIMEOUT = 5.0
+# Handshake statuses meaning the device no longer knows our UUID
+UUID_REJECTED = (401, 403, 404)
+# Seconds the realtime demand has to settle before the device is told
+DEMAND_DEBOUNCE = 5.0
+# Seconds of device time between two channel activity checks
+ACTIVITY_CHECK_INTERVAL = 10
+
 
 async def async_setup_entry(
         hass: HomeAssistant,
@@ -24,226 +80,984 @@ async def async_setup_entry(
         async_add_entities: AddEntitiesCallback) -> None:
     """设置传感器平台"""
     apollo = config_entry.runtime_data
-    host = config_entry.data["host"]
-    uuid = await apollo.register_uuid(host)
-    if uuid:
-        data_ctrl_res = await apollo.data_ctrl(uuid, host)
-        if data_ctrl_res:
-            sensor_manager = WebSocketSensorManager(hass, async_add_entities, apollo, uuid, host)
-            hass.loop.create_task(sensor_manager.start())
+    store = ApolloStore(hass, config_entry.entry_id)
+    await store.async_load()
+    if store.endpoint:
+        apollo.resolver.prime(store.endpoint)
+    # 使用保存的 UUID 直接连接, 设备拒绝时才重新注册
+    hub = async_get_hub(hass)
+    sensor_manager = WebSocketSensorManager(
+        hass, async_add_entities, apollo, store.uuid, config_entry.options,
+        ApolloBackfill(hass, apollo, store), hub, config_entry.entry_id, store)
+    config_entry.async_on_unload(
+        config_entry.add_update_listener(sensor_manager.async_options_updated))
+    config_entry.async_on_unload(
+        async_track_time_interval(hass, sensor_manager.async_backfill, BACKFILL_INTERVAL))
+    # 按保存的通道目录立即创建实体, 连接在后台进行
+    if store.slot_count:
+        sensor_manager.discover(store.slot_count)
+    sensor_manager.async_set_capture(config_entry.options.get(CONF_CAPTURE, DEFAULT_CAPTURE))
+    # 连接由 hub 持有, 在 async_unload_entry 中停止
+    hub.async_add_device(config_entry.entry_id, sensor_manager)
+    async_add_entities(
+        ApolloDiagnosticSensor(sensor_manager, description)
+        for description in DIAGNOSTIC_SENSORS)
 
 
 class WebSocketSensorManager:
     """管理 WebSocket 连接和传感器的类"""
 
-    def __init__(self, hass, async_add_entities, apollo, uuid, host):
+    def __init__(self, hass, async_add_entities, apollo, uuid, options, backfill, hub, key,
+                 store=None):
         self.hass = hass
         self.async_add_entities = async_add_entities
         self.sensors = {}  # 保存已经创建的传感器
         self.apollo = apollo
-        self.websocket_url = "ws://{}/ws/interface?uuid={}"
         # self.max_subdev_num = 3
         self.uuid = uuid
-        self.host = host
+        self.power_policy = WritePolicy.from_options(options, power=True)
+        self.energy_policy = WritePolicy.from_options(options, power=False)
+        self.backfill = backfill
+        self.hub = hub
+        self.key = key
+        self.store = store
+        self.ws = None
+        # 连接健康状态
+        self.frames = 0
+        self.dropped = 0
+        self.last_frame = 0.0
+        self.metrics = PipelineMetrics() if options.get(CONF_METRICS) else None
+        # 按 (version, type) 选择解码器, 未注册的数据包类型不解码
+        self.packets = sample_registry(options.get(CONF_VERIFY_CRC, DEFAULT_VERIFY_CRC))
+        self.reconnects = 0
+        self.stalls = 0
+        self.last_error = None
+        self.backoff = ExponentialBackoff()
+        # 帧到达间隔的滑动平均, 用于判断数据流是否停滞; 重连后保留
+        self.frame_interval = None
+        self._connected_at = 0.0
+        self._last_arrival = 0.0
+        self._ping_sent = 0.0
+        self._last_pong = 0.0
+        # 接收和分发之间的有界队列
+        self.queue = FrameQueue(
+            options.get(CONF_QUEUE_SIZE, DEFAULT_QUEUE_SIZE),
+            options.get(CONF_QUEUE_POLICY, DEFAULT_QUEUE_POLICY))
+        # frame slot -> (slot, Power sensor, Energy sensor)
+        self._dispatch = ()
+        # 活动通道跟踪: None 表示为所有通道创建实体
+        self._active = None
+        self._last_active = {}
+        self._next_activity_check = 0
+        self.idle_timeout = options.get(CONF_IDLE_HOURS, DEFAULT_IDLE_HOURS) * 3600
+        if options.get(CONF_TRACK_ACTIVITY, DEFAULT_TRACK_ACTIVITY):
+            self._active = self._initial_active_slots()
+        # 在解码之后增量计算的派生传感器
+        self.aggregator = FrameAggregator(
+            options.get(CONF_AVERAGE_WINDOW, DEFAULT_AVERAGE_WINDOW),
+            options.get(CONF_DEMAND_WINDOW, DEFAULT_DEMAND_WINDOW))
+        if store is not None:
+            self.aggregator.restore(store.aggregates)
+        self.derived = {}
+        # frame slot -> (slot, Average sensor, Daily sensor)
+        self._derived = ()
+        self._peak = None
+        self._unmetered = None
+        window = options.get(CONF_DOWNSAMPLE_WINDOW, DEFAULT_DOWNSAMPLE_WINDOW)
+        self.downsampler = Downsampler(window) if window else None
+        self._last_energy = ()
+        # 原始帧抓包, 用于离线回放
+        self.capture = None
+        self._capture_release = None
+        # 连接期间启动的任务, 卸载时取消或等待
+        self._tasks = set()
+        self._flushes = set()
+        # 不经过状态机的实时数据订阅者
+        self._live = []
+        self.fanout = StreamFanout()
+        # 按需开关设备的实时数据流
+        self.demand = RealtimeDemand(self._async_demand_changed)
+        self._demand_timer = None
+        self._streaming = asyncio.Event()
+        self._streaming.set()
+        # 设备上的实时数据开关: 上次运行可能已暂停, 未知时连接前先同步
+        self._device_rtdata = None
+        self._ctrl_lock = asyncio.Lock()
+        # async_shutdown 之后不再向设备发送任何请求
+        self.closed = False
+        self._channel_names = []
+        self._slot_count = 0
+        # 阈值回调在解码之后、实体更新之前调用
+        self.watches = async_get_watches(hass, key) if hass is not None else ChannelWatches()
+        self._watch_release = None
+        self.watches.on_change = self._async_watches_changed
+        if self.watches.watches:
+            self._async_watches_changed(True)
+
+    @callback
+    def async_backfill(self, _now=None):
+        """Import logged history the device holds beyond the high-water mark."""
+        if self.uuid is not None and not self.closed and not self.backfill.running:
+            self._async_track(self.backfill.async_run(self.uuid), "backfill")
+
+    async def async_options_updated(self, hass, entry):
+        """Apply changed write policy options to existing sensors."""
+        if self.closed:
+            # 条目正在卸载, 更新监听器稍后才被移除
+            return
+        self.power_policy = WritePolicy.from_options(entry.options, power=True)
+        self.energy_policy = WritePolicy.from_options(entry.options, power=False)
+        if not entry.options.get(CONF_METRICS):
+            self.metrics = None
+        elif self.metrics is None:
+            self.metrics = PipelineMetrics()
+        self.packets.verify_crc = entry.options.get(CONF_VERIFY_CRC, DEFAULT_VERIFY_CRC)
+        self.queue.configure(
+            entry.options.get(CONF_QUEUE_SIZE, DEFAULT_QUEUE_SIZE),
+            entry.options.get(CONF_QUEUE_POLICY, DEFAULT_QUEUE_POLICY))
+        self.aggregator.configure(
+            entry.options.get(CONF_AVERAGE_WINDOW, DEFAULT_AVERAGE_WINDOW),
+            entry.options.get(CONF_DEMAND_WINDOW, DEFAULT_DEMAND_WINDOW))
+        window = entry.options.get(CONF_DOWNSAMPLE_WINDOW, DEFAULT_DOWNSAMPLE_WINDOW)
+        if not window:
+            self.downsampler = None
+            for sensor in self.sensors.values():
+                sensor.clear_window()
+        elif self.downsampler is None or self.downsampler.window != window:
+            self.downsampler = Downsampler(window)
+        self.async_set_capture(entry.options.get(CONF_CAPTURE, DEFAULT_CAPTURE))
+        self.idle_timeout = entry.options.get(CONF_IDLE_HOURS, DEFAULT_IDLE_HOURS) * 3600
+        self._async_set_tracking(entry.options.get(CONF_TRACK_ACTIVITY, DEFAULT_TRACK_ACTIVITY))
+        for sensors in (self.sensors, self.derived):
+            for sensor_name, sensor in sensors.items():
+                sensor.write_policy = self._policy_for(sensor_name)
+
+    def _initial_active_slots(self):
+        if self.store is not None and self.store.active_slots is not None:
+            return set(self.store.active_slots) | {0}
+        # 首次启用时保留已有通道, 空闲超时后再隐藏
+        slot_count = self.store.slot_count if self.store is not None else 0
+        return set(range(max(slot_count, 1)))
+
+    @callback
+    def _async_set_tracking(self, track):
+        if track == (self._active is not None):
+            return
+        if track:
+            self._active = self._initial_active_slots()
+            self._last_active.clear()
+        else:
+            self._async_set_hidden(range(1, self._slot_count), False)
+            self._active = None
+        if self.store is not None:
+            self.store.async_set_active_slots(
+                sorted(self._active) if self._active is not None else None)
+        if self._slot_count:
+            self.discover(self._slot_count)
+
+    def _check_activity(self, frame):
+        """Add channels that carry load, drop channels idle for too long."""
+        timestamp = frame.timestamp
+        self._next_activity_check = timestamp + ACTIVITY_CHECK_INTERVAL
+        power = frame.power
+        active = self._active
+        last_active = self._last_active
+        activated = []
+        idle = []
+        # 主通道始终保留
+        for slot in range(1, len(power)):
+            if power[slot]:
+                last_active[slot] = timestamp
+                if slot not in active:
+                    activated.append(slot)
+            elif slot in active and (
+                    timestamp - last_active.setdefault(slot, timestamp) > self.idle_timeout):
+                idle.append(slot)
+        if not activated and not idle:
+            return
+        active.update(activated)
+        active.difference_update(idle)
+        _LOGGER.debug("Channels activated %s, idle %s", activated, idle)
+        if self.store is not None:
+            self.store.async_set_active_slots(sorted(active))
+        self._async_set_hidden(idle, True)
+        self._async_set_hidden(activated, False)
+        self.discover(len(power))
+
+    @callback
+    def _async_set_hidden(self, slots, hidden):
+        """Hide the entities of idle channels, unhide them once active again.
+
+        Entities hidden by the user are left alone.
+        """
+        if self.hass is None:
+            return
+        registry = er.async_get(self.hass)
+        for slot in slots:
+            name = channel_name(slot)
+            for key in ("Power", "Energy", "Average", "Daily"):
+                sensor = self.sensors.get(f"{name}-{key}") or self.derived.get(f"{name}-{key}")
+                if sensor is None or sensor.entity_id is None:
+                    continue
+                if (entry := registry.async_get(sensor.entity_id)) is None:
+                    continue
+                if hidden and entry.hidden_by is None:
+                    registry.async_update_entity(
+                        sensor.entity_id, hidden_by=er.RegistryEntryHider.INTEGRATION)
+                elif not hidden and entry.hidden_by is er.RegistryEntryHider.INTEGRATION:
+                    registry.async_update_entity(sensor.entity_id, hidden_by=None)
+
+    def _policy_for(self, sensor_name):
+        if sensor_name.endswith(("-Energy", "-Daily")):
+            return self.energy_policy
+        return self.power_policy
+
+    def health(self):
+        """Return the connection health of the device."""
+        return {
+            "connected": self.ws is not None,
+            "frames": self.frames,
+            "seconds_since_last_frame": (
+                round(time.monotonic() - self.last_frame, 1) if self.last_frame else None),
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+            "stalls": self.stalls,
+            "frame_interval": (
+                round(self.frame_interval, 3) if self.frame_interval is not None else None),
+            "last_error": self.last_error,
+            "queue": self.queue.as_dict(),
+            "packets": self.packets.as_dict(),
+            "subscribers": self.fanout.as_dict(),
+            "realtime_consumers": self.demand.count,
+            "threshold_watches": len(self.watches.watches),
+            "streaming": self._streaming.is_set(),
+        }
+
+    @callback
+    def async_heartbeat(self):
+        """Ping the device, called from the hub's timer wheel."""
+        ws = self.ws
+        if ws is None or ws.closed or self.closed:
+            return
+        if self._ping_sent <= self._last_pong:
+            # 上一个 ping 尚未收到 pong 时不重置计时
+            self._ping_sent = time.monotonic()
+        self._async_track(self._ping(ws), "ping")
+
+    async def _ping(self, ws):
+        try:
+            await ws.ping()
+            _LOGGER.debug("Heartbeat sent")
+        except Exception as e:
+            _LOGGER.error("Failed to send heartbeat: %s", e)
+
+    @callback
+    def async_check_liveness(self, now):
+        """Drop the connection if frames or pongs stopped arriving.
+
+        Frames are expected within STALL_FACTOR observed frame intervals
+        (at least MIN_STALL_TIMEOUT), and pongs within PONG_TIMEOUT. Until
+        an interval has been observed, on this or an earlier connection,
+        frames are expected within FIRST_FRAME_TIMEOUT.
+        """
+        ws = self.ws
+        if ws is None or ws.closed:
+            return
+        if not self._last_arrival:
+            silent = now - self._connected_at
+            timeout = FIRST_FRAME_TIMEOUT
+        elif self.frame_interval is None:
+            # 还没有测到帧间隔, 慢速设备不能按默认间隔判断
+            silent = now - self._last_arrival
+            timeout = FIRST_FRAME_TIMEOUT
+        else:
+            silent = now - self._last_arrival
+            timeout = max(MIN_STALL_TIMEOUT, STALL_FACTOR * self.frame_interval)
+        if silent > timeout:
+            reason = f"no frame for {silent:.1f} s"
+            if not self._last_arrival:
+                # 实时数据可能在设备上被关闭, 重连前重新打开
+                self._device_rtdata = None
+        elif self._ping_sent > self._last_pong and now - self._ping_sent > PONG_TIMEOUT:
+            reason = f"no pong for {now - self._ping_sent:.1f} s"
+        else:
+            return
+        _LOGGER.warning("Reconnecting %s: %s", self.apollo.serial_number_name, reason)
+        self.stalls += 1
+        self.last_error = reason
+        self.ws = None
+        # close() 会立即唤醒接收循环, 等待对端关闭帧的部分在后台完成
+        self._async_track(ws.close(), "close")
 
     async def start(self):
         """启动 WebSocket 客户端"""
-        if self.apollo.apollo_type == "serial_number":
-            url = self.websocket_url.format(self.apollo.serial_number_name, self.uuid)
-        elif self.apollo.apollo_type == "serial_number_local":
-            url = self.websocket_url.format(self.apollo.serial_number_name + ".local", self.uuid)
-        else:
-            url = self.websocket_url.format(self.host, self.uuid)
+        dispatcher = self._async_track(self._dispatch_loop(), "dispatch")
+        try:
+            await self._receive_loop()
+        finally:
+            dispatcher.cancel()
+
+    def _async_track(self, target, name, cancel_on_shutdown=True):
+        """Start a task that async_shutdown cancels or waits for."""
+        task = self.hass.async_create_background_task(target, f"{DOMAIN} {name} {self.key}")
+        tasks = self._tasks if cancel_on_shutdown else self._flushes
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        return task
+
+    async def async_shutdown(self):
+        """Tear down everything the connection started, after start() ended.
+
+        Capture buffers and the store are written out; every other task is
+        cancelled and live subscriptions are ended. Afterwards demand changes, for example from entities being
+        removed by the platform unload, no longer reach the device.
+        """
+        self.closed = True
+        # 监视保留给重新加载后的连接
+        if self.watches.on_change == self._async_watches_changed:
+            self.watches.on_change = None
+        self._async_watches_changed(False)
+        if self._demand_timer is not None:
+            self._demand_timer.cancel()
+            self._demand_timer = None
+        self.async_set_capture(False)
+        self.fanout.async_close()
+        # 通知实时订阅者连接已结束, 以便前端重新订阅
+        live, self._live = self._live, []
+        for _listener, on_close in live:
+            if on_close is not None:
+                on_close()
+        if (ws := self.ws) is not None:
+            self.ws = None
+            await ws.close()
+        for task in self._tasks:
+            task.cancel()
+        pending = self._tasks | self._flushes
+        if pending:
+            await asyncio.wait(pending)
+        if self.store is not None:
+            await self.store.async_flush()
+
+    @callback
+    def _async_watches_changed(self, active):
+        # 有阈值监视时设备需要持续发送实时数据
+        if active and self._watch_release is None:
+            self._watch_release = self.demand.async_acquire()
+        elif not active and self._watch_release is not None:
+            self._watch_release()
+            self._watch_release = None
+
+    @callback
+    def _async_demand_changed(self, _active):
+        """Re-check the demand once entities and subscribers have settled."""
+        if self.hub is None or self.closed:
+            return
+        # 实体批量添加或移除时只通知设备一次
+        if self._demand_timer is not None:
+            self._demand_timer.cancel()
+        self._demand_timer = self.hub.wheel.schedule(DEMAND_DEBOUNCE, self._async_apply_demand)
+
+    def _wants_realtime(self):
+        # 通道目录未知时需要实时帧来发现通道
+        return self.demand.active or not self._slot_count
+
+    @callback
+    def _async_apply_demand(self):
+        """Pause or resume the realtime stream to match the consumers."""
+        self._demand_timer = None
+        if self.closed:
+            return
+        wanted = self._wants_realtime()
+        if wanted == self._streaming.is_set():
+            return
+        if wanted:
+            _LOGGER.info("Resuming realtime data of %s", self.apollo.serial_number_name)
+            # 接收循环在连接前打开设备的实时数据
+            self._streaming.set()
+            return
+        _LOGGER.info("No realtime consumers left, pausing realtime data of %s",
+                     self.apollo.serial_number_name)
+        self._streaming.clear()
+        if (ws := self.ws) is not None:
+            self.ws = None
+            self._async_track(ws.close(), "close")
+        self._async_track(self._async_sync_rtdata(), "data ctrl")
+
+    async def _async_sync_rtdata(self):
+        """Tell the device whether to send realtime frames."""
+        async with self._ctrl_lock:
+            wanted = int(self._streaming.is_set())
+            if self.closed or self.uuid is None or wanted == self._device_rtdata:
+                return
+            # 同步和日志始终打开, 供历史数据回填使用
+            if await self.apollo.data_ctrl(
+                    self.uuid, rtdata_enable=wanted, sync_enable=1, logdata_enable=1):
+                self._device_rtdata = wanted
+
+    @callback
+    def async_set_capture(self, enabled):
+        """Start or stop capturing raw frames to disk."""
+        if enabled and self.capture is None:
+            path = Path(self.hass.config.path(
+                DOMAIN, f"{self.apollo.serial_number_name}.cap"))
+            self.capture = FrameCapture(CaptureWriter(path))
+            self._capture_release = self.demand.async_acquire()
+            _LOGGER.info("Capturing frames to %s", path)
+        elif not enabled and self.capture is not None:
+            capture, self.capture = self.capture, None
+            self._capture_release()
+            capture.closing = True
+            self._async_flush_capture(capture)
+
+    @callback
+    def _async_flush_capture(self, capture=None):
+        capture = capture or self.capture
+        if not capture.flushing:
+            capture.flushing = True
+            self._async_track(
+                self._async_write_capture(capture), "capture", cancel_on_shutdown=False)
+
+    async def _async_write_capture(self, capture):
+        """Write buffered records in the executor, one write at a time."""
+        try:
+            while capture.buffered:
+                await self.hass.async_add_executor_job(capture.writer.write, capture.take())
+            if capture.closing:
+                await self.hass.async_add_executor_job(capture.writer.close)
+        except OSError as e:
+            _LOGGER.error("Failed to write frame capture: %s", e)
+        finally:
+            capture.flushing = False
+
+    async def _async_register(self):
+        """Register a new UUID and enable the data streams for it."""
+        uuid = await self.apollo.register_uuid()
+        if not uuid:
+            raise aiohttp.ClientError("Device registration failed")
+        # 打开日志记录和同步, 供历史数据回填使用
+        if not await self.apollo.data_ctrl(uuid, sync_enable=1, logdata_enable=1):
+            raise aiohttp.ClientError("Device data control failed")
+        self.uuid = uuid
+        self._device_rtdata = 1
+        _LOGGER.info("Registered with %s", self.apollo.serial_number_name)
+
+    def _on_connected(self, ws):
+        self.ws = ws
+        if self.store is not None:
+            self.store.async_set_session(self.uuid, self.apollo.resolver.endpoint)
+        self._connected_at = time.monotonic()
+        self._last_arrival = 0.0
+        self._ping_sent = self._last_pong = 0.0
+
+    async def _receive_loop(self):
+        """Receive stage: read the socket and hand frames to the queue."""
+        queue = self.queue
         while True:
+            if not self._streaming.is_set():
+                await self._streaming.wait()
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.ws_connect(url) as ws:
-                        _LOGGER.info("WebSocket connection established")
-
-                        # 启动心跳任务
-                        async def send_heartbeat():
-                            while True:
-                                try:
-                                    await ws.ping()
-                                    _LOGGER.debug("Heartbeat sent")
-                                except Exception as e:
-                                    _LOGGER.error("Failed to send heartbeat: %s", e)
-                                    break
-                                await asyncio.sleep(10)  # 心跳间隔时间
-
-                        # 启动处理消息和心跳的并行任务
-                        heartbeat_task = asyncio.create_task(send_heartbeat())
-                        try:
-                            async for msg in ws:
-                                if msg.type == aiohttp.WSMsgType.BINARY:
-                                    await self.handle_message(msg.data)
-                                elif msg.type == aiohttp.WSMsgType.ERROR:
-                                    _LOGGER.error("WebSocket error: %s", msg.data)
-                        finally:
-                            heartbeat_task.cancel()
+                if self.uuid is None:
+                    await self._async_register()
+                elif self._device_rtdata != 1:
+                    await self._async_sync_rtdata()
+                url = await self.apollo.websocket_url_for(self.uuid)
+                async with await self.apollo.session.ws_connect(url, autoping=False) as ws:
+                    _LOGGER.info("WebSocket connection established")
+                    self._on_connected(ws)
+                    self.hub.async_start_heartbeat(self.key)
+                    self.async_backfill()
+                    try:
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.BINARY:
+                                now = time.monotonic()
+                                if not self._last_arrival:
+                                    self.backoff.reset()
+                                elif self.frame_interval is None:
+                                    self.frame_interval = now - self._last_arrival
+                                else:
+                                    self.frame_interval += (
+                                        now - self._last_arrival - self.frame_interval) * 0.1
+                                self._last_arrival = self.last_frame = now
+                                self.frames += 1
+                                if self.capture is not None and self.capture.append(
+                                        time.time(), msg.data):
+                                    self._async_flush_capture()
+                                if self.fanout.raw:
+                                    self.fanout.publish_raw(msg.data)
+                                queue.put_nowait(msg.data)
+                            elif msg.type == aiohttp.WSMsgType.PONG:
+                                self._last_pong = time.monotonic()
+                            elif msg.type == aiohttp.WSMsgType.PING:
+                                await ws.pong(msg.data)
+                            elif msg.type == aiohttp.WSMsgType.ERROR:
+                                _LOGGER.error("WebSocket error: %s", msg.data)
+                    finally:
+                        self.hub.async_stop_heartbeat(self.key)
+                        self.ws = None
+            except aiohttp.WSServerHandshakeError as e:
+                _LOGGER.error("WebSocket handshake failed: %s", e)
+                self.last_error = str(e)
+                if e.status in UUID_REJECTED:
+                    # 设备重启后旧 UUID 失效, 下次连接前重新注册
+                    self.uuid = None
+                    if self.store is not None:
+                        self.store.async_set_session(None, self.apollo.resolver.endpoint)
+                else:
+                    self.apollo.resolver.invalidate()
             except aiohttp.ClientError as e:
                 _LOGGER.error("WebSocket connection failed: %s", e)
+                self.last_error = str(e)
+                self.apollo.resolver.invalidate()
             except asyncio.CancelledError:
                 _LOGGER.info("WebSocket connection canceled")
                 break
             except Exception as e:
                 _LOGGER.error("Unexpected error: %s", e)
+                self.last_error = str(e)
 
-            _LOGGER.info("Attempting to reconnect in 10 seconds...")
-            # 等待一段时间后重试连接
-            await asyncio.sleep(10)
+            if not self._streaming.is_set():
+                # 暂停实时数据时主动断开, 不算重连
+                continue
+            delay = self.backoff.next_delay()
+            _LOGGER.info("Attempting to reconnect in %.2f seconds...", delay)
+            # 指数退避加抖动, 由 hub 错开各设备的重连
+            self.reconnects += 1
+            await self.hub.async_wait_reconnect(delay)
+
+    async def _dispatch_loop(self):
+        """Dispatch stage: decode queued frames and update the sensors."""
+        queue = self.queue
+        while True:
+            data = await queue.get()
+            try:
+                await self.handle_message(data)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error dispatching frame")
 
     async def handle_message(self, data):
         """处理 WebSocket 消息"""
-        analysis_device_data = self.analysis_data(data)
-        if analysis_device_data:
-            device_datas = {"main": analysis_device_data["sampleDataWsPayload"]["mainChData"],
-                            "sub": analysis_device_data["sampleDataWsPayload"]["subDevChData"]}
-
-            for device_type, device_data in device_datas.items():
-                if device_type == "main":
-                    self.add_sensor(device_data, device_type)
-                else:
-                    for ind, sub_data in enumerate(device_data):
-                        for ch_ind, ch_data in enumerate(sub_data["chDatas"]):
-                            sub_ch_name = device_type + "_" + str(ind) + "-channel_" + str(ch_ind + 1)
-                            self.add_sensor(ch_data, sub_ch_name)
-
-    def add_sensor(self, data, device_type):
-        """创建传感器"""
-        for key, value in data.items():
-            sensor_name = f"{device_type}-{key}"
-            if sensor_name not in self.sensors:
-                # 如果尚未创建对应的传感器，则创建
-                new_sensor = ApolloSensor(self.apollo, sensor_name)
-                self.sensors[sensor_name] = new_sensor
-                self.async_add_entities([new_sensor])
-            # 更新传感器状态
-            self.sensors[sensor_name].update_state(value)
+        metrics = self.metrics
+        if metrics is None:
+            frame = self.analysis_data(data)
+            if frame is None:
+                self.dropped += 1
+            else:
+                self.dispatch_frame(frame)
+            return
+        started = time.perf_counter_ns()
+        frame = self.analysis_data(data)
+        decoded = time.perf_counter_ns()
+        metrics.decode.record(decoded - started)
+        if frame is None:
+            self.dropped += 1
+            return
+        self.dispatch_frame(frame)
+        metrics.dispatch.record(time.perf_counter_ns() - decoded)
 
-    def analysis_data(self, data):
-        """解析完整数据"""
-        offset = 0  # 偏移量
-        # 解析 apolloWsPkgHead
-        apollo_ws_pkg_head_format = "<IIII"  # version, crc, type, length
-        apollo_ws_pkg_head_size = struct.calcsize(apollo_ws_pkg_head_format)
-        version, crc, type_, length = struct.unpack_from(apollo_ws_pkg_head_format, data, offset)
-        offset += apollo_ws_pkg_head_size
-        if type_ != 2:
-            return None
-        apolloWsPkgHead = {
-            "version": version,
-            "crc": crc,
-            "type": type_,
-            "length": length,
-        }
+    def state_writes(self):
+        """Return the number of state writes of all channel and derived sensors."""
+        return (sum(sensor.writes for sensor in self.sensors.values())
+                + sum(sensor.writes for sensor in self.derived.values()))
 
-        # 解析 sampleDataWsPayload
-        sample_data_ws_payload_format = "<IB"  # timeStamp, subDevNum
-        sample_data_ws_payload_size = struct.calcsize(sample_data_ws_payload_format)
-        timeStamp, subDevNum = struct.unpack_from(sample_data_ws_payload_format, data, offset)
-        subDevNum = 2
-        offset += sample_data_ws_payload_size
-
-        # 解析 mainChData
-        main_ch_data_format = "<iI"  # Power, Energy
-        main_ch_data_size = struct.calcsize(main_ch_data_format)
-        main_power, main_energy = struct.unpack_from(main_ch_data_format, data, offset)
-        offset += main_ch_data_size
-
-        mainChData = {
-            "Power": main_power,
-            "Energy": main_energy,
-        }
+    def dispatch_frame(self, frame):
+        """Push the values of a decoded frame to its sensors."""
+        if frame.slot_count != self._slot_count:
+            self.discover(frame.slot_count)
+        if self._active is not None and frame.timestamp >= self._next_activity_check:
+            self._check_activity(frame)
+        power = frame.power
+        if self.watches.watches:
+            self.watches.check(power, frame.timestamp)
+        energy = frame.energy
+        downsampler = self.downsampler
+        if downsampler is None:
+            for slot, power_sensor, energy_sensor in self._dispatch:
+                power_sensor.update_state(power[slot])
+                energy_sensor.update_state(energy[slot])
+        else:
+            # 每个窗口只写一次状态, 电能取窗口内最后一帧的值
+            closed = downsampler.add(frame.timestamp, power)
+            if closed is not None:
+                mins, maxs, means = closed
+                last_energy = self._last_energy
+                for slot, power_sensor, energy_sensor in self._dispatch:
+                    power_sensor.update_window(mins[slot], maxs[slot], means[slot])
+                    energy_sensor.update_state(last_energy[slot])
+            self._last_energy = energy
+        self.dispatch_derived(frame)
+        if self._live or self.fanout.decoded:
+            self._publish_live(frame)
 
-        # 解析 subDevChData
-        subDevChData = []
-        for _ in range(1, subDevNum):
-            # 解析子设备编号
-            sub_dev_number_format = "<B"  # number
-            sub_dev_number_size = struct.calcsize(sub_dev_number_format)
-            number = struct.unpack_from(sub_dev_number_format, data, offset)[0]
-            offset += sub_dev_number_size
-
-            # 解析 10 个 chDatas
-            ch_data_format = "<iI"  # Power, Energy
-            ch_data_size = struct.calcsize(ch_data_format)
-            chDatas = []
-            for _ in range(10):  # 每个子设备有 10 个数据对
-                power, energy = struct.unpack_from(ch_data_format, data, offset)
-                offset += ch_data_size
-                chDatas.append({
-                    "Power": power,
-                    "Energy": energy,
-                })
-
-            subDevChData.append({
-                "number": number,
-                "chDatas": chDatas,
-            })
-
-        sampleDataWsPayload = {
-            "timeStamp": timeStamp,
-            "subDevNum": subDevNum,
-            "mainChData": mainChData,
-            "subDevChData": subDevChData,
-        }
+    @callback
+    def async_subscribe_live(self, listener, on_close=None):
+        """Call listener with the values of every frame, bypassing the state machine.
+
+        on_close is called when the connection shuts down and the
+        subscription ends.
+        """
+        entry = (listener, on_close)
+        self._live.append(entry)
+        release = self.demand.async_acquire()
 
-        # 返回解析结果
-        res = {
-            "apolloWsPkgHead": apolloWsPkgHead,
-            "sampleDataWsPayload": sampleDataWsPayload,
+        @callback
+        def remove():
+            if entry in self._live:
+                self._live.remove(entry)
+            release()
+
+        return remove
+
+    def _publish_live(self, frame):
+        message = {
+            "timestamp": frame.timestamp,
+            "channels": self._channel_names,
+            "power": frame.power.tolist(),
+            "energy": frame.energy.tolist(),
         }
-        return res
+        for listener, _on_close in tuple(self._live):
+            # 出错的订阅者不能影响其它订阅者
+            try:
+                listener(message)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error in live listener")
+        self.fanout.publish_decoded(message)
 
+    @callback
+    def async_subscribe_stream(self, subscriber):
+        """Add a local stream client, see ApolloStreamView."""
+        unsubscribe = self.fanout.async_subscribe(subscriber)
+        release = self.demand.async_acquire()
 
-class ApolloSensor(Entity):
-    """Representation of a Sensor."""
+        @callback
+        def remove():
+            unsubscribe()
+            release()
 
-    device_class = SensorDeviceClass.POWER
+        return remove
 
-    _attr_unit_of_measurement = UnitOfPower.WATT
+    def dispatch_derived(self, frame):
+        """Fold a frame into the aggregates and push the derived values."""
+        aggregator = self.aggregator
+        if aggregator.update(frame) and self.store is not None:
+            self.store.async_set_aggregates(aggregator.as_dict())
+        average = aggregator.average
+        # 禁用的实体不会加入 HA, 跳过计算
+        for slot, average_sensor, daily_sensor in self._derived:
+            if average_sensor.hass is not None:
+                average_sensor.update_state(round(average.mean(slot), 1))
+            if daily_sensor.hass is not None:
+                daily_sensor.update_state(aggregator.daily_energy(slot))
+        if aggregator.peak is not None:
+            self._peak.update_state(round(aggregator.peak, 1))
+        if self._unmetered is not None:
+            self._unmetered.update_state(aggregator.unmetered)
 
-    def __init__(self, apollo, sensor_name):
-        """Initialize the sensor."""
-        # super().__init__(apollo)
-        self._sensor_name = sensor_name
-        # self._available = True
-        self._state = None
-        self._apollo = apollo
+    def discover(self, slot_count):
+        """Create missing sensors for a frame layout and rebuild the dispatch table.
 
-    @property
-    def device_info(self):
-        """Return information to link this entity with the correct device."""
-        return {"identifiers": {(DOMAIN, self._apollo.serial_number_name)},
-                "name": self._apollo.serial_number_name,
-                "manufacturer": "Cyberiot",
-                "model": "Apollo Device"}
+        All new sensors of the layout are registered in a single batch. With
+        activity tracking only active channels are included.
+        """
+        new_sensors = []
+        dispatch = []
+        derived = []
+        if self._active is None:
+            slots = range(slot_count)
+        else:
+            # 只为有负载的通道创建实体, 空闲通道不进入分发表
+            slots = sorted(slot for slot in self._active if slot < slot_count)
+        for slot in slots:
+            name = channel_name(slot)
+            pair = []
+            for key in ("Power", "Energy"):
+                sensor_name = f"{name}-{key}"
+                sensor = self.sensors.get(sensor_name)
+                if sensor is None:
+                    # 如果尚未创建对应的传感器，则创建
+                    sensor = ApolloSensor(
+                        self.apollo, sensor_name, self._policy_for(sensor_name), self.demand)
+                    self.sensors[sensor_name] = sensor
+                    new_sensors.append(sensor)
+                pair.append(sensor)
+            dispatch.append((slot, *pair))
+            # 子通道的派生传感器默认禁用
+            derived.append((slot, *(
+                self._derived_sensor(f"{name}-{key}", description, new_sensors, slot == 0)
+                for key, description in (("Average", AVERAGE_POWER), ("Daily", DAILY_ENERGY))
+            )))
+        self._peak = self._derived_sensor("PeakDemand", PEAK_DEMAND, new_sensors)
+        if slot_count > 1:
+            self._unmetered = self._derived_sensor("Unmetered", UNMETERED_POWER, new_sensors)
+        else:
+            self._unmetered = None
+        if new_sensors:
+            self.async_add_entities(new_sensors)
+        self._dispatch = tuple(dispatch)
+        self._derived = tuple(derived)
+        self._channel_names = [channel_name(slot) for slot in range(slot_count)]
+        if slot_count != self._slot_count:
+            self._slot_count = slot_count
+            # 通道目录已知后, 没有消费者的设备可以暂停实时数据
+            self._async_demand_changed(self.demand.active)
+        if self.store is not None:
+            self.store.async_set_slot_count(slot_count)
 
-    @property
-    def unique_id(self):
-        """返回唯一标识符"""
-        return f"{self._apollo.serial_number_name}_{self._sensor_name}"
+    def _derived_sensor(self, sensor_name, description, new_sensors, enabled=True):
+        sensor = self.derived.get(sensor_name)
+        if sensor is None:
+            sensor = ApolloDerivedSensor(
+                self.apollo, sensor_name, description, self._policy_for(sensor_name),
+                self.demand, enabled)
+            self.derived[sensor_name] = sensor
+            new_sensors.append(sensor)
+        return sensor
 
-    @property
-    def name(self):
-        """返回传感器的名称"""
-        return self._sensor_name
+    def analysis_data(self, data):
+        """解析完整数据"""
+        return self.packets.decode(data)
 
-    @property
-    def state(self):
-        """Return the state of the sensor."""
-        return self._state
+
+def apollo_device_info(apollo):
+    """Return the device registry entry shared by all entities of a device."""
+    return DeviceInfo(
+        identifiers={(DOMAIN, apollo.serial_number_name)},
+        name=apollo.serial_number_name,
+        manufacturer="Cyberiot",
+        model="Apollo Device",
+    )
+
+
+class ApolloSensor(RestoreSensor):
+    """Power or energy of one channel.
+
+    Everything Home Assistant reads on a state write is set up once here,
+    so an update only stores the value.
+    """
+
+    _attr_should_poll = False
+
+    def __init__(self, apollo, sensor_name, write_policy, demand=None):
+        """Initialize the sensor."""
+        self.demand = demand
+        self._attr_name = sensor_name
+        self._attr_unique_id = f"{apollo.serial_number_name}_{sensor_name}"
+        self._attr_device_info = apollo_device_info(apollo)
+        if sensor_name.endswith("-Energy"):
+            self._attr_device_class = SensorDeviceClass.ENERGY
+            self._attr_native_unit_of_measurement = UnitOfEnergy.WATT_HOUR
+            self._attr_state_class = SensorStateClass.TOTAL_INCREASING
+        else:
+            self._attr_device_class = SensorDeviceClass.POWER
+            self._attr_native_unit_of_measurement = UnitOfPower.WATT
+            self._attr_state_class = SensorStateClass.MEASUREMENT
+        self._attr_native_value = None
+        self.write_policy = write_policy
+        # 最后一次写入 HA 的值和时间
+        self._written = None
+        self._written_at = 0.0
+        self.writes = 0
+
+    async def async_added_to_hass(self):
+        """Restore the last known value until the first frame arrives."""
+        await super().async_added_to_hass()
+        if self.demand is not None:
+            self.async_on_remove(self.demand.async_acquire())
+        if self._attr_native_value is not None:
+            return
+        # 降采样后功率是窗口均值, 按保存的原值恢复, 不取整
+        if (last_data := await self.async_get_last_sensor_data()) is not None:
+            self._attr_native_value = last_data.native_value
 
     def update_state(self, value):
         """更新传感器状态"""
-        # if not self._initialized:
-        #     _LOGGER.error("Cannot update state: Sensor %s is not initialized", self._attr_name)
-        #     return
-        self._state = value
+        self._attr_native_value = value
+        if self.hass is None:
+            # 尚未添加到 HA, 添加时会写入当前状态
+            return
+        now = time.monotonic()
+        if self.write_policy.should_write(self._written, value, self._written_at, now):
+            self._written = value
+            self._written_at = now
+            self.writes += 1
+            self.async_write_ha_state()
+
+    def update_window(self, minimum, maximum, mean):
+        """Write the statistics of a downsampling window as one state."""
+        value = self._attr_native_value = round(mean, 1)
+        self._attr_extra_state_attributes = {"min": minimum, "max": maximum, "mean": value}
+        if self.hass is None:
+            return
+        self._written = value
+        self._written_at = time.monotonic()
+        self.writes += 1
         self.async_write_ha_state()
 
-    # @property
-    # def available(self):
-    #     """Return True if the device is online."""
-        # return self._available
+    def clear_window(self):
+        """Drop the window attributes when downsampling is turned off."""
+        self._attr_extra_state_attributes = None
+
+
+class ApolloDerivedSensor(SensorEntity):
+    """Value the manager computes incrementally from the frame stream."""
+
+    _attr_should_poll = False
+
+    def __init__(self, apollo, sensor_name, description, write_policy, demand=None,
+                 enabled=True):
+        """Initialize the sensor."""
+        self.demand = demand
+        self.entity_description = description
+        self._attr_name = sensor_name
+        self._attr_unique_id = f"{apollo.serial_number_name}_{sensor_name}"
+        self._attr_device_info = apollo_device_info(apollo)
+        self._attr_entity_registry_enabled_default = enabled
+        self.write_policy = write_policy
+        self._written = None
+        self._written_at = 0.0
+        self.writes = 0
+
+    async def async_added_to_hass(self):
+        """Keep the realtime stream running while the sensor is enabled."""
+        if self.demand is not None:
+            self.async_on_remove(self.demand.async_acquire())
+
+    def update_state(self, value):
+        """Update the value, writing it according to the write policy."""
+        self._attr_native_value = value
+        if self.hass is None:
+            return
+        now = time.monotonic()
+        if self.write_policy.should_write(self._written, value, self._written_at, now):
+            self._written = value
+            self._written_at = now
+            self.writes += 1
+            self.async_write_ha_state()
+
+
+AVERAGE_POWER = SensorEntityDescription(
+    key="average_power",
+    device_class=SensorDeviceClass.POWER,
+    state_class=SensorStateClass.MEASUREMENT,
+    native_unit_of_measurement=UnitOfPower.WATT,
+)
+DAILY_ENERGY = SensorEntityDescription(
+    key="daily_energy",
+    device_class=SensorDeviceClass.ENERGY,
+    state_class=SensorStateClass.TOTAL_INCREASING,
+    native_unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
+    suggested_display_precision=3,
+)
+PEAK_DEMAND = SensorEntityDescription(
+    key="peak_demand",
+    device_class=SensorDeviceClass.POWER,
+    state_class=SensorStateClass.MEASUREMENT,
+    native_unit_of_measurement=UnitOfPower.WATT,
+)
+UNMETERED_POWER = SensorEntityDescription(
+    key="unmetered_power",
+    device_class=SensorDeviceClass.POWER,
+    state_class=SensorStateClass.MEASUREMENT,
+    native_unit_of_measurement=UnitOfPower.WATT,
+)
+
+
+@dataclass(frozen=True, kw_only=True)
+class ApolloDiagnosticDescription(SensorEntityDescription):
+    """Describes a pipeline diagnostic sensor."""
+
+    value_fn: Callable[[WebSocketSensorManager], float | int | None]
+    requires_metrics: bool = False
+
+
+def _p95(histogram):
+    return histogram.percentile(95)
+
+
+DIAGNOSTIC_SENSORS = (
+    ApolloDiagnosticDescription(
+        key="frames",
+        name="Frames received",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda manager: manager.frames,
+    ),
+    ApolloDiagnosticDescription(
+        key="dropped_packets",
+        name="Dropped packets",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda manager: manager.dropped,
+    ),
+    ApolloDiagnosticDescription(
+        key="reconnects",
+        name="Reconnects",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda manager: manager.reconnects,
+    ),
+    ApolloDiagnosticDescription(
+        key="last_frame_age",
+        name="Seconds since last frame",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        value_fn=lambda manager: manager.health()["seconds_since_last_frame"],
+    ),
+    ApolloDiagnosticDescription(
+        key="state_writes",
+        name="State writes",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda manager: manager.state_writes(),
+    ),
+    ApolloDiagnosticDescription(
+        key="queue_depth",
+        name="Queue depth",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda manager: len(manager.queue),
+    ),
+    ApolloDiagnosticDescription(
+        key="queue_drops",
+        name="Queue drops",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda manager: manager.queue.drops,
+    ),
+    ApolloDiagnosticDescription(
+        key="decode_latency_p95",
+        name="Decode latency p95",
+        native_unit_of_measurement=UnitOfTime.MICROSECONDS,
+        requires_metrics=True,
+        value_fn=lambda manager: _p95(manager.metrics.decode),
+    ),
+    ApolloDiagnosticDescription(
+        key="dispatch_latency_p95",
+        name="Dispatch latency p95",
+        native_unit_of_measurement=UnitOfTime.MICROSECONDS,
+        requires_metrics=True,
+        value_fn=lambda manager: _p95(manager.metrics.dispatch),
+    ),
+)
+
+
+class ApolloDiagnosticSensor(SensorEntity):
+    """Polled view on the websocket pipeline of a device."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    entity_description: ApolloDiagnosticDescription
+
+    def __init__(self, manager, description):
+        """Initialize the sensor."""
+        self.entity_description = description
+        self._manager = manager
+        serial_number_name = manager.apollo.serial_number_name
+        self._attr_unique_id = f"{serial_number_name}_diagnostic-{description.key}"
+        self._attr_name = f"{serial_number_name} {description.name}"
+        self._attr_device_info = apollo_device_info(manager.apollo)
+
+    @property
+    def available(self):
+        """Latency sensors need metrics to be enabled in the options."""
+        return not self.entity_description.requires_metrics or self._manager.metrics is not None
+
+    @property
+    def native_value(self):
+        """Return the current value."""
+        if not self.available:
+            return None
+        return self.entity_description.value_fn(self._manager)
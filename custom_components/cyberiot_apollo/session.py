@@ -0,0 +1,167 @@
+"""Pooled HTTP/WebSocket session layer for Apollo devices."""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+
+import aiohttp
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CONNECT_TIMEOUT = 3.0
+DEFAULT_READ_TIMEOUT = 10.0
+
+
+class RoundTripStats:
+    """Round trip timings of one kind of device call."""
+
+    __slots__ = ("count", "failures", "last", "total", "max")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.failures = 0
+        self.last = 0.0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed: float, ok: bool) -> None:
+        """Record one round trip."""
+        self.count += 1
+        if not ok:
+            self.failures += 1
+        self.last = elapsed
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the timings in milliseconds."""
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "last_ms": round(self.last * 1000, 1),
+            "avg_ms": round(self.total / self.count * 1000, 1) if self.count else None,
+            "max_ms": round(self.max * 1000, 1),
+        }
+
+
+class ApolloSession:
+    """Per-device view on Home Assistant's shared, keep-alive client session.
+
+    All REST calls and websocket handshakes of a device go through here so
+    they reuse pooled connections, share the same connect/read timeouts and
+    have their round trips recorded.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+    ) -> None:
+        self._session = async_get_clientsession(hass)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._timeout = aiohttp.ClientTimeout(
+            total=None, sock_connect=connect_timeout, sock_read=read_timeout
+        )
+        self.stats: dict[str, RoundTripStats] = {}
+
+    def _record(self, op: str, started: float, ok: bool) -> None:
+        elapsed = time.monotonic() - started
+        stats = self.stats.get(op)
+        if stats is None:
+            stats = self.stats[op] = RoundTripStats()
+        stats.record(elapsed, ok)
+        _LOGGER.debug("%s round trip %.1f ms (ok=%s)", op, elapsed * 1000, ok)
+
+    async def request(
+        self, method: str, url: str, op: str, payload: dict[str, Any] | None = None
+    ) -> bytes | None:
+        """Send a request and return the body of a 200 response.
+
+        Returns None for any other status. Network failures and timeouts are
+        raised as ``aiohttp.ClientError``.
+        """
+        data = json.dumps(payload) if payload is not None else None
+        started = time.monotonic()
+        ok = False
+        try:
+            async with self._session.request(
+                method, url, data=data, timeout=self._timeout
+            ) as response:
+                if response.status != 200:
+                    return None
+                body = await response.read()
+                ok = True
+                return body
+        except TimeoutError as err:
+            raise aiohttp.ServerTimeoutError(f"Timeout talking to {url}") from err
+        finally:
+            self._record(op, started, ok)
+
+    async def post(self, url: str, payload: dict[str, Any], op: str) -> bytes | None:
+        """POST a JSON payload."""
+        return await self.request("POST", url, op, payload)
+
+    async def get(self, url: str, op: str) -> bytes | None:
+        """GET a resource."""
+        return await self.request("GET", url, op)
+
+    async def iter_post(
+        self, url: str, payload: dict[str, Any], op: str, chunk_size: int = 4096
+    ) -> AsyncIterator[bytes]:
+        """POST a JSON payload and stream the body of the response.
+
+        Non-200 responses are raised as ``aiohttp.ClientResponseError``. The
+        recorded round trip covers the time to the response headers.
+        """
+        started = time.monotonic()
+        recorded = False
+        try:
+            async with self._session.post(
+                url, data=json.dumps(payload), timeout=self._timeout
+            ) as response:
+                recorded = True
+                self._record(op, started, response.status == 200)
+                if response.status != 200:
+                    raise aiohttp.ClientResponseError(
+                        response.request_info,
+                        response.history,
+                        status=response.status,
+                        message="Unexpected status",
+                    )
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    yield chunk
+        except TimeoutError as err:
+            raise aiohttp.ServerTimeoutError(f"Timeout talking to {url}") from err
+        finally:
+            if not recorded:
+                self._record(op, started, False)
+
+    async def ws_connect(
+        self, url: str, **kwargs: Any
+    ) -> aiohttp.ClientWebSocketResponse:
+        """Open a websocket on the shared session."""
+        started = time.monotonic()
+        ok = False
+        try:
+            async with asyncio.timeout(self.connect_timeout + self.read_timeout):
+                ws = await self._session.ws_connect(url, **kwargs)
+            ok = True
+            return ws
+        except TimeoutError as err:
+            raise aiohttp.ServerTimeoutError(f"Timeout connecting to {url}") from err
+        finally:
+            self._record("ws_connect", started, ok)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return round trip statistics per call kind."""
+        return {op: stats.as_dict() for op, stats in self.stats.items()}
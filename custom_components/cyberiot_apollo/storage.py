@@ -0,0 +1,101 @@
+"""Persisted per-device state."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+
+STORAGE_VERSION = 1
+SAVE_DELAY = 10
+
+
+class ApolloStore:
+    """State of one config entry that survives restarts."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        self._store: Store[dict[str, Any]] = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}"
+        )
+        self._data: dict[str, Any] = {}
+
+    async def async_load(self) -> None:
+        """Load the stored state."""
+        self._data = await self._store.async_load() or {}
+
+    async def async_remove(self) -> None:
+        """Remove the stored state."""
+        await self._store.async_remove()
+
+    async def async_flush(self) -> None:
+        """Write the state now, replacing a pending delayed save.
+
+        Called when the entry unloads, so a reload reads what this instance
+        last recorded and no late write of it can overwrite the next one.
+        """
+        await self._store.async_save(self._data)
+
+    def _async_changed(self, delay: float = SAVE_DELAY) -> None:
+        self._store.async_delay_save(lambda: self._data, delay)
+
+    @property
+    def high_water_mark(self) -> int | None:
+        """Return the timestamp up to which history has been imported."""
+        return self._data.get("high_water_mark")
+
+    def async_set_high_water_mark(self, timestamp: int) -> None:
+        """Record that history before timestamp has been imported."""
+        self._data["high_water_mark"] = timestamp
+        self._async_changed()
+
+    @property
+    def uuid(self) -> str | None:
+        """Return the UUID the device registered us with."""
+        return self._data.get("uuid")
+
+    @property
+    def endpoint(self) -> str | None:
+        """Return the endpoint the device was last reached on."""
+        return self._data.get("endpoint")
+
+    def async_set_session(self, uuid: str | None, endpoint: str | None) -> None:
+        """Record the device session, None clears the value."""
+        if self._data.get("uuid") == uuid and self._data.get("endpoint") == endpoint:
+            return
+        self._data["uuid"] = uuid
+        self._data["endpoint"] = endpoint
+        # 设备会话立即保存, 否则重启后会重新注册
+        self._async_changed(0)
+
+    @property
+    def slot_count(self) -> int:
+        """Return the number of channel slots of the last seen frame layout."""
+        return self._data.get("slot_count", 0)
+
+    def async_set_slot_count(self, slot_count: int) -> None:
+        """Record the frame layout so entities can be created at startup."""
+        if self._data.get("slot_count") != slot_count:
+            self._data["slot_count"] = slot_count
+            self._async_changed()
+
+    @property
+    def aggregates(self) -> dict[str, Any] | None:
+        """Return the saved state of the derived sensors."""
+        return self._data.get("aggregates")
+
+    def async_set_aggregates(self, aggregates: dict[str, Any]) -> None:
+        """Record the state of the derived sensors."""
+        self._data["aggregates"] = aggregates
+        self._async_changed()
+
+    @property
+    def active_slots(self) -> list[int] | None:
+        """Return the channel slots that showed activity, None if never tracked."""
+        return self._data.get("active_slots")
+
+    def async_set_active_slots(self, slots: list[int] | None) -> None:
+        """Record the channel slots that have entities."""
+        self._data["active_slots"] = slots
+        self._async_changed()
@@ -0,0 +1,132 @@
+"""Power threshold callbacks on single channels.
+
+Watches are evaluated by the device connection right after a frame is
+decoded, before any entity is updated, and call their action only when the
+channel crosses the threshold. Load controllers react within one frame
+without waiting for state writes, the event bus and state triggers.
+"""
+from __future__ import annotations
+
+from collections.abc import Callable
+import logging
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+
+from .const import DOMAIN
+from .decoder import channel_slot
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_WATCHES = f"{DOMAIN}_watches"
+
+# action(channel, power, above, device timestamp)
+ThresholdAction = Callable[[str, int, bool, int], None]
+
+
+class ThresholdWatch:
+    """Edge-triggered threshold on the power of one channel.
+
+    The channel goes above once power exceeds ``threshold`` and below once
+    it drops under ``threshold - hysteresis``. The first value only sets
+    the side, so nothing fires for a channel that is already above.
+    """
+
+    __slots__ = ("action", "above", "channel", "lower", "slot", "threshold")
+
+    def __init__(
+        self, channel: str, threshold: float, action: ThresholdAction, hysteresis: float = 0.0
+    ) -> None:
+        self.channel = channel
+        self.slot = channel_slot(channel)
+        self.threshold = threshold
+        self.lower = threshold - hysteresis
+        self.action = action
+        self.above: bool | None = None
+
+    def update(self, power: int, timestamp: int) -> None:
+        """Compare a new value and call the action on a crossing."""
+        if power > self.threshold:
+            above = True
+        elif power < self.lower:
+            above = False
+        else:
+            return
+        if above is self.above:
+            return
+        first = self.above is None
+        self.above = above
+        if not first:
+            # 出错的回调不能影响其它监视和实体更新
+            try:
+                self.action(self.channel, power, above, timestamp)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error in threshold callback of %s", self.channel)
+
+
+class ChannelWatches:
+    """The threshold watches of one device.
+
+    Kept per config entry for the lifetime of Home Assistant, so watches
+    survive reloads and can be added before the device is set up.
+    ``on_change`` is told when the first watch is added and the last one
+    removed.
+    """
+
+    def __init__(self) -> None:
+        self.watches: tuple[ThresholdWatch, ...] = ()
+        self.on_change: Callable[[bool], None] | None = None
+
+    @callback
+    def async_add(self, watch: ThresholdWatch) -> CALLBACK_TYPE:
+        """Add a watch; return the callback that removes it."""
+        # 替换而不是修改元组, 回调中增删监视不影响正在进行的遍历
+        self.watches = (*self.watches, watch)
+        if len(self.watches) == 1 and self.on_change is not None:
+            self.on_change(True)
+
+        @callback
+        def remove() -> None:
+            if watch not in self.watches:
+                return
+            self.watches = tuple(item for item in self.watches if item is not watch)
+            if not self.watches and self.on_change is not None:
+                self.on_change(False)
+
+        return remove
+
+    def check(self, power, timestamp: int) -> None:
+        """Evaluate every watch against the power values of a frame."""
+        slots = len(power)
+        for watch in self.watches:
+            if watch.slot < slots:
+                watch.update(power[watch.slot], timestamp)
+
+
+@callback
+def async_get_watches(hass: HomeAssistant, entry_id: str) -> ChannelWatches:
+    """Return the threshold watches of a config entry."""
+    watches = hass.data.setdefault(DATA_WATCHES, {})
+    if (device := watches.get(entry_id)) is None:
+        device = watches[entry_id] = ChannelWatches()
+    return device
+
+
+@callback
+def async_track_channel_threshold(
+    hass: HomeAssistant,
+    entry_id: str,
+    channel: str,
+    threshold: float,
+    action: ThresholdAction,
+    hysteresis: float = 0.0,
+) -> CALLBACK_TYPE:
+    """Call action when the power of a channel crosses threshold.
+
+    ``channel`` is a channel name such as ``main`` or ``sub_0-channel_1``.
+    The action runs in the event loop for every frame that crosses, so it
+    must be a quick callback; schedule anything slower. Returns the
+    callback that stops the watch. Raises ValueError for an unknown
+    channel.
+    """
+    watch = ThresholdWatch(channel, threshold, action, hysteresis)
+    return async_get_watches(hass, entry_id).async_add(watch)
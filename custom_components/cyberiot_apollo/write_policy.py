@@ -0,0 +1,73 @@
+"""State write policies for Apollo sensors."""
+from __future__ import annotations
+
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any
+
+from .const import (
+    CONF_MAX_STALENESS,
+    CONF_MIN_WRITE_INTERVAL,
+    CONF_POWER_DEADBAND,
+    CONF_POWER_DEADBAND_PERCENT,
+    CONF_SKIP_UNCHANGED,
+    DEFAULT_MAX_STALENESS,
+    DEFAULT_MIN_WRITE_INTERVAL,
+    DEFAULT_POWER_DEADBAND,
+    DEFAULT_POWER_DEADBAND_PERCENT,
+    DEFAULT_SKIP_UNCHANGED,
+)
+
+
+@dataclass(frozen=True, slots=True)
+class WritePolicy:
+    """Decide whether a new sensor value is worth a state write.
+
+    ``deadband`` is absolute, or a percentage of the last written value when
+    ``deadband_percent`` is set. ``max_staleness`` forces a write once the
+    last one is that old, whatever the other rules say; 0 disables it.
+    """
+
+    skip_unchanged: bool = DEFAULT_SKIP_UNCHANGED
+    deadband: float = 0.0
+    deadband_percent: bool = False
+    min_interval: float = DEFAULT_MIN_WRITE_INTERVAL
+    max_staleness: float = DEFAULT_MAX_STALENESS
+
+    @classmethod
+    def from_options(cls, options: Mapping[str, Any], power: bool) -> WritePolicy:
+        """Build the policy of a Power (deadband) or Energy sensor."""
+        return cls(
+            skip_unchanged=options.get(CONF_SKIP_UNCHANGED, DEFAULT_SKIP_UNCHANGED),
+            deadband=(
+                options.get(CONF_POWER_DEADBAND, DEFAULT_POWER_DEADBAND) if power else 0.0
+            ),
+            deadband_percent=options.get(
+                CONF_POWER_DEADBAND_PERCENT, DEFAULT_POWER_DEADBAND_PERCENT
+            ),
+            min_interval=options.get(CONF_MIN_WRITE_INTERVAL, DEFAULT_MIN_WRITE_INTERVAL),
+            max_staleness=options.get(CONF_MAX_STALENESS, DEFAULT_MAX_STALENESS),
+        )
+
+    def should_write(
+        self, written: float | None, value: float, written_at: float, now: float
+    ) -> bool:
+        """Return True if value should replace the last written value."""
+        if written is None:
+            return True
+        elapsed = now - written_at
+        if self.max_staleness and elapsed >= self.max_staleness:
+            return True
+        if elapsed < self.min_interval:
+            return False
+        if value == written:
+            return not self.skip_unchanged
+        if self.deadband:
+            band = (
+                abs(written) * self.deadband / 100
+                if self.deadband_percent
+                else self.deadband
+            )
+            if abs(value - written) <= band:
+                return False
+        return True
@@ -0,0 +1,12 @@
+"""The bulk decoder agrees with the per-frame decoder."""
+import pytest
+
+pytest.importorskip("numpy")
+
+from tools.bulkcheck import compare, generated  # noqa: E402
+
+
+@pytest.mark.parametrize("sub_dev_num", [0, 1, 4, 8])
+def test_bulk_matches_decode_frame(sub_dev_num):
+    """Generated frames, with other packet types and short subDevNum mixed in."""
+    assert compare(generated(sub_dev_num, 2000)) == []
@@ -0,0 +1,207 @@
+"""Benchmark the frame decode and dispatch hot path.
+
+Run from the repository root::
+
+    python -m tools.bench run --sub-devs 0 1 4 8
+    python -m tools.bench compare .benchmarks/<old>.json .benchmarks/<new>.json
+
+Decode scenarios run anywhere; the dispatch scenarios import the sensor
+platform and need a Home Assistant development environment.
+"""
+from __future__ import annotations
+
+import argparse
+from collections.abc import Callable
+import json
+from pathlib import Path
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from .frames import FrameGenerator, load_decoder
+
+DEFAULT_OUTPUT = Path(".benchmarks")
+
+
+class StubSensor:
+    """Stand-in entity that only keeps the last value."""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = None
+
+    def update_state(self, value) -> None:
+        self.value = value
+
+
+class StubApollo:
+    serial_number_name = "econest-hems-bench"
+
+
+def _drive(coro) -> None:
+    """Run a coroutine that never suspends without an event loop."""
+    try:
+        coro.send(None)
+    except StopIteration:
+        pass
+    else:
+        raise RuntimeError("benchmarked coroutine suspended")
+
+
+def _stub_manager(slot_count: int):
+    from custom_components.cyberiot_apollo.decoder import channel_name
+    from custom_components.cyberiot_apollo.sensor import WebSocketSensorManager
+
+    manager = WebSocketSensorManager(
+        None, lambda entities: None, StubApollo(), "bench", {}, None, None, "bench"
+    )
+    for slot in range(slot_count):
+        for key in ("Power", "Energy"):
+            manager.sensors[f"{channel_name(slot)}-{key}"] = StubSensor()
+    return manager
+
+
+def scenarios(frames: list[bytes]) -> dict[str, Callable[[int], None]]:
+    """Return the per-frame callables to measure, keyed by scenario name."""
+    decode_frame = load_decoder().decode_frame
+    result = {"decode": lambda i: decode_frame(frames[i])}
+    try:
+        manager = _stub_manager(decode_frame(frames[0]).slot_count)
+    except ImportError as err:
+        print(f"skipping dispatch scenarios: {err}", file=sys.stderr)
+        return result
+    decoded = [decode_frame(frame) for frame in frames]
+    handle_message = manager.handle_message
+    result["decode+dispatch"] = lambda i: _drive(handle_message(frames[i]))
+    result["dispatch"] = lambda i: manager.dispatch_frame(decoded[i])
+    return result
+
+
+def _percentile(ordered: list[int], pct: float) -> float:
+    index = min(int(len(ordered) * pct / 100), len(ordered) - 1)
+    return ordered[index] / 1000
+
+
+def measure(func: Callable[[int], None], count: int) -> dict[str, float]:
+    """Measure throughput, latency percentiles and allocations of func."""
+    for i in range(min(count, 1000)):
+        func(i)
+
+    started = time.perf_counter()
+    for i in range(count):
+        func(i)
+    elapsed = time.perf_counter() - started
+
+    perf_counter_ns = time.perf_counter_ns
+    latencies = []
+    for i in range(count):
+        begin = perf_counter_ns()
+        func(i)
+        latencies.append(perf_counter_ns() - begin)
+    latencies.sort()
+
+    samples = min(count, 2000)
+    allocated = 0
+    tracemalloc.start()
+    try:
+        for i in range(samples):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            func(i)
+            allocated += tracemalloc.get_traced_memory()[1] - current
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "frames_per_second": round(count / elapsed, 1),
+        "p50_us": _percentile(latencies, 50),
+        "p90_us": _percentile(latencies, 90),
+        "p99_us": _percentile(latencies, 99),
+        "max_us": latencies[-1] / 1000,
+        "alloc_bytes_per_frame": round(allocated / samples, 1),
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args: argparse.Namespace) -> None:
+    revision = _git_revision()
+    report = {
+        "revision": revision,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "frames": args.frames,
+        "results": {},
+    }
+    for sub_dev_num in args.sub_devs:
+        frames = FrameGenerator(sub_dev_num, seed=args.seed).frames(args.frames)
+        for name, func in scenarios(frames).items():
+            key = f"{name}/sub_devs={sub_dev_num}"
+            report["results"][key] = result = measure(func, args.frames)
+            print(
+                f"{key:32} {result['frames_per_second']:>12,.0f} fps"
+                f"  p50 {result['p50_us']:8.2f} us  p99 {result['p99_us']:8.2f} us"
+                f"  {result['alloc_bytes_per_frame']:8.0f} B/frame"
+            )
+    args.output.mkdir(parents=True, exist_ok=True)
+    path = args.output / f"{revision}.json"
+    path.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"results written to {path}")
+
+
+def compare(args: argparse.Namespace) -> None:
+    base = json.loads(args.base.read_text())
+    head = json.loads(args.head.read_text())
+    print(f"{base['revision']} -> {head['revision']}")
+    for key, new in head["results"].items():
+        old = base["results"].get(key)
+        if old is None:
+            continue
+        fps = new["frames_per_second"] / old["frames_per_second"] - 1
+        p99 = new["p99_us"] / old["p99_us"] - 1 if old["p99_us"] else 0.0
+        alloc = new["alloc_bytes_per_frame"] - old["alloc_bytes_per_frame"]
+        flag = "  REGRESSION" if fps < -args.threshold else ""
+        print(
+            f"{key:32} fps {fps:+7.1%}  p99 {p99:+7.1%}  alloc {alloc:+8.0f} B{flag}"
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--sub-devs", type=int, nargs="+", default=[0, 1, 4, 8])
+    run_parser.add_argument("--frames", type=int, default=20000)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    run_parser.set_defaults(func=run)
+
+    compare_parser = sub.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("base", type=Path)
+    compare_parser.add_argument("head", type=Path)
+    compare_parser.add_argument(
+        "--threshold", type=float, default=0.05, help="flag fps drops above this ratio"
+    )
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
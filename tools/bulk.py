@@ -0,0 +1,94 @@
+"""Vectorized decoding of many Apollo frames at once.
+
+Meant for batches such as logged history from ``/sync`` or captured traffic,
+where decoding frame by frame dominates. The integration keeps using
+decoder.decode_frame, so NumPy is only needed by the tools. All frames of a
+batch must share one layout, i.e. the same length field, which holds for the
+frames one device sends.
+"""
+from __future__ import annotations
+
+import numpy as np
+
+from .frames import CHANNELS_PER_SUB_DEV, HEAD, PKG_TYPE_SAMPLE_DATA, SAMPLE_PREFIX, SUB_DEV
+
+HEAD_SIZE = HEAD.size
+SUB_DEV_OFFSET = HEAD.size + SAMPLE_PREFIX.size
+SUB_DEV_SIZE = SUB_DEV.size
+
+CHANNEL = np.dtype([("power", "<i4"), ("energy", "<u4")])
+SUB_DEV = np.dtype([("number", "u1"), ("channels", CHANNEL, (CHANNELS_PER_SUB_DEV,))])
+
+
+def frame_dtype(length: int) -> np.dtype:
+    """Return the structured dtype of a frame whose length field is length.
+
+    The number of sub-devices is what the payload can hold; trailing bytes
+    are covered by the item size but not by a field.
+    """
+    sub_devs = max(length - SAMPLE_PREFIX.size, 0) // SUB_DEV_SIZE
+    fields = np.dtype([
+        ("version", "<u4"),
+        ("crc", "<u4"),
+        ("type", "<u4"),
+        ("length", "<u4"),
+        ("timestamp", "<u4"),
+        ("sub_dev_num", "u1"),
+        ("main", CHANNEL),
+        ("sub_devs", SUB_DEV, (sub_devs,)),
+    ])
+    if HEAD_SIZE + length == fields.itemsize:
+        return fields
+    return np.dtype({
+        "names": fields.names,
+        "formats": [fields.fields[name][0] for name in fields.names],
+        "offsets": [fields.fields[name][1] for name in fields.names],
+        "itemsize": HEAD_SIZE + length,
+    })
+
+
+def decode_frames(data: bytes | bytearray | memoryview) -> np.ndarray:
+    """Return a buffer of concatenated frames as a structured array.
+
+    The array is a read-only view of data, nothing is copied. Raises
+    ValueError if data does not hold whole frames of a single layout.
+    """
+    view = memoryview(data).cast("B")
+    if not len(view):
+        return np.empty(0, frame_dtype(SAMPLE_PREFIX.size))
+    if len(view) < SUB_DEV_OFFSET:
+        raise ValueError(f"Truncated frame of {len(view)} bytes")
+    length = HEAD.unpack_from(view)[3]
+    dtype = frame_dtype(length)
+    if length < SAMPLE_PREFIX.size or len(view) % dtype.itemsize:
+        raise ValueError(f"{len(view)} bytes are not whole frames of length {length}")
+    records = np.frombuffer(view, dtype)
+    if not (records["length"] == length).all():
+        raise ValueError("Frames of different lengths in one batch")
+    return records
+
+
+def sample_mask(records: np.ndarray) -> np.ndarray:
+    """Return which records are sample data that fill the whole layout.
+
+    These are exactly the records decode_frame turns into frames with the
+    same slots as power() and energy() return.
+    """
+    sub_devs = records.dtype["sub_devs"].shape[0]
+    return (records["type"] == PKG_TYPE_SAMPLE_DATA) & (records["sub_dev_num"] == sub_devs)
+
+
+def _channels(records: np.ndarray, field: str) -> np.ndarray:
+    main = records["main"][field]
+    sub = records["sub_devs"]["channels"][field].reshape(len(records), -1)
+    return np.concatenate((main[:, None], sub), axis=1)
+
+
+def power(records: np.ndarray) -> np.ndarray:
+    """Return the power of every record, one row per frame in ApolloFrame slot order."""
+    return _channels(records, "power")
+
+
+def energy(records: np.ndarray) -> np.ndarray:
+    """Return the energy counters of every record, one row per frame in slot order."""
+    return _channels(records, "energy")
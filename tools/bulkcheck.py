@@ -0,0 +1,122 @@
+"""Check the bulk decoder against the per-frame decoder.
+
+Decodes the same frames with decoder.decode_frame and with bulk.decode_frames
+and fails on the first value that differs, then prints how fast each one
+was. Frames are generated, or read from a capture file::
+
+    python -m tools.bulkcheck --sub-devs 0 1 4 8 --frames 20000
+    python -m tools.bulkcheck --capture econest-hems-123456.cap
+
+Needs NumPy.
+"""
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+import sys
+import time
+
+from . import bulk
+from .frames import HEAD, FrameGenerator, load_decoder, load_module
+
+
+def generated(sub_dev_num: int, count: int) -> list[bytes]:
+    """Return count frames with a few packets that are not sample data mixed in."""
+    frames = FrameGenerator(sub_dev_num, seed=sub_dev_num).frames(count)
+    for index in range(7, count, 97):
+        frame = bytearray(frames[index])
+        # 同样长度的非采样数据包
+        HEAD.pack_into(frame, 0, 1, 0, 5, len(frame) - HEAD.size)
+        frames[index] = bytes(frame)
+    for index in range(11, count, 89) if sub_dev_num else ():
+        frame = bytearray(frames[index])
+        # 少报 subDevNum 的帧
+        frame[HEAD.size + 4] = sub_dev_num - 1
+        frames[index] = bytes(frame)
+    return frames
+
+
+def captured(path: Path) -> list[bytes]:
+    """Return the frames of a capture file."""
+    read_capture = load_module("capture").read_capture
+    return [bytes(frame) for _received, frame in read_capture(path)]
+
+
+def compare(frames: list[bytes]) -> list[str]:
+    """Return the differences between both decoders, empty if they agree."""
+    decode_frame = load_decoder().decode_frame
+    records = bulk.decode_frames(b"".join(frames))
+    mask = bulk.sample_mask(records)
+    power = bulk.power(records)
+    energy = bulk.energy(records)
+    errors = []
+    for index, data in enumerate(frames):
+        frame = decode_frame(data)
+        record = records[index]
+        full = frame is not None and frame.slot_count == power.shape[1]
+        if bool(mask[index]) != full:
+            errors.append(f"frame {index}: mask {mask[index]}, decoded {frame is not None}")
+        elif frame is None:
+            continue
+        elif (
+            (record["version"], record["crc"], record["type"], record["length"])
+            != (frame.version, frame.crc, frame.type, frame.length)
+            or record["timestamp"] != frame.timestamp
+        ):
+            errors.append(f"frame {index}: header differs")
+        elif full and (
+            power[index].tolist() != frame.power.tolist()
+            or energy[index].tolist() != frame.energy.tolist()
+            or record["sub_devs"]["number"].tobytes() != frame.numbers
+        ):
+            errors.append(f"frame {index}: channel values differ")
+        if len(errors) >= 10:
+            break
+    return errors
+
+
+def timing(frames: list[bytes]) -> dict[str, float]:
+    """Return the frames per second of both decoders."""
+    decode_frame = load_decoder().decode_frame
+    data = b"".join(frames)
+    started = time.perf_counter()
+    for frame in frames:
+        decode_frame(frame)
+    single = time.perf_counter() - started
+    started = time.perf_counter()
+    records = bulk.decode_frames(data)
+    records = records[bulk.sample_mask(records)]
+    bulk.power(records)
+    bulk.energy(records)
+    vectorized = time.perf_counter() - started
+    return {
+        "per_frame_fps": round(len(frames) / single),
+        "bulk_fps": round(len(frames) / vectorized),
+        "speedup": round(single / vectorized, 1),
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sub-devs", type=int, nargs="+", default=[0, 1, 4, 8])
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--capture", type=Path)
+    args = parser.parse_args(argv)
+    if args.capture is not None:
+        batches = {args.capture.name: captured(args.capture)}
+    else:
+        batches = {f"sub_devs={n}": generated(n, args.frames) for n in args.sub_devs}
+    failed = False
+    for name, frames in batches.items():
+        errors = compare(frames)
+        for error in errors:
+            print(f"{name}: {error}")
+        failed |= bool(errors)
+        result = timing(frames)
+        print(f"{name:12} {'FAIL' if errors else 'ok':4}  "
+              + "  ".join(f"{k} {v}" for k, v in result.items()))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
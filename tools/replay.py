@@ -0,0 +1,87 @@
+"""Replay a raw frame capture through the decode and dispatch path.
+
+Captures are written by the integration when the "Capture raw frames"
+option is on, to ``<config>/cyberiot_apollo/<device>.cap``. Run from the
+repository root::
+
+    python -m tools.replay econest-hems-123456.cap --speed 10
+    python -m tools.replay econest-hems-123456.cap.1 --speed 0
+
+``--speed 1`` keeps the recorded timing, ``0`` replays as fast as
+possible. Without Home Assistant installed only decoding is replayed.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from pathlib import Path
+import sys
+import time
+
+from .bench import _drive, _percentile, _stub_manager
+from .frames import load_decoder, load_module
+
+
+def _handler():
+    """Return the per-frame callable and the manager, if it can be imported."""
+    decode_frame = load_decoder().decode_frame
+    try:
+        manager = _stub_manager(0)
+    except ImportError as err:
+        print(f"replaying decode only: {err}", file=sys.stderr)
+        return decode_frame, None
+    handle_message = manager.handle_message
+    return lambda frame: _drive(handle_message(frame)), manager
+
+
+async def replay(path: Path, speed: float) -> dict[str, float]:
+    """Feed every record of a capture to the handler, paced by speed."""
+    read_capture = load_module("capture").read_capture
+    handle, manager = _handler()
+    perf_counter_ns = time.perf_counter_ns
+    latencies = []
+    first = None
+    started = time.monotonic()
+    for received, frame in read_capture(path):
+        if first is None:
+            first = received
+        if speed > 0:
+            delay = (received - first) / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        begin = perf_counter_ns()
+        handle(frame)
+        latencies.append(perf_counter_ns() - begin)
+    elapsed = time.monotonic() - started
+    if not latencies:
+        return {"frames": 0}
+    busy = sum(latencies) / 1e9
+    latencies.sort()
+    result = {
+        "frames": len(latencies),
+        "recorded_seconds": round(received - first, 3),
+        "elapsed_seconds": round(elapsed, 3),
+        "frames_per_second": round(len(latencies) / busy, 1) if busy else 0.0,
+        "p50_us": _percentile(latencies, 50),
+        "p99_us": _percentile(latencies, 99),
+        "max_us": latencies[-1] / 1000,
+    }
+    if manager is not None:
+        result["dropped"] = manager.dropped
+        result["channels"] = manager._slot_count
+    return result
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", type=Path)
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="multiple of real time, 0 for no pacing"
+    )
+    args = parser.parse_args(argv)
+    for key, value in asyncio.run(replay(args.capture, args.speed)).items():
+        print(f"{key:20} {value}")
+
+
+if __name__ == "__main__":
+    main()
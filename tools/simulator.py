@@ -0,0 +1,246 @@
+"""Local stand-in for Apollo devices, for load and soak testing.
+
+Each simulated unit is an aiohttp server with the device's REST endpoints
+and websocket stream. Start a few units on consecutive ports::
+
+    python -m tools.simulator --units 20 --port 18080 --sub-devs 2 --rate 5
+
+and configure the integration with host ``127.0.0.1:<port>``.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from dataclasses import dataclass
+import json
+import logging
+import random
+import time
+import uuid as uuid_lib
+
+from aiohttp import WSMsgType, web
+
+from .frames import PKG_TYPE_SAMPLE_DATA, FrameGenerator, build_frame
+
+_LOGGER = logging.getLogger(__name__)
+
+PASSWORD = "cyber2019"
+
+
+@dataclass
+class Faults:
+    """Per-frame probabilities of injected faults."""
+
+    drop: float = 0.0
+    stall: float = 0.0
+    stall_seconds: float = 30.0
+    malformed: float = 0.0
+    foreign: float = 0.0
+
+
+class SimulatedApollo:
+    """One simulated device."""
+
+    def __init__(
+        self,
+        serial_number: str,
+        sub_dev_num: int,
+        rate: float,
+        jitter: float,
+        faults: Faults,
+        seed: int,
+    ) -> None:
+        self.serial_number = serial_number
+        self.sub_dev_num = sub_dev_num
+        self.interval = 1 / rate
+        self.jitter = jitter
+        self.faults = faults
+        self._random = random.Random(seed)
+        self._generator = FrameGenerator(sub_dev_num, seed=seed, interval=self.interval)
+        self._seed = seed
+        self.sessions: dict[str, dict[str, int]] = {}
+        self.connections = 0
+        self.frames_sent = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.post("/register", self.register),
+            web.post("/data-ctrl", self.data_ctrl),
+            web.post("/sync", self.sync),
+            web.get("/system-info", self.system_info),
+            web.get("/ws/interface", self.websocket),
+        ])
+        return app
+
+    async def _json(self, request: web.Request) -> dict:
+        try:
+            return json.loads(await request.read())
+        except ValueError as err:
+            raise web.HTTPBadRequest(text="invalid json") from err
+
+    def _session(self, data: dict) -> dict[str, int]:
+        session = self.sessions.get(data.get("uuid"))
+        if session is None:
+            raise web.HTTPUnauthorized(text="unknown uuid")
+        return session
+
+    async def register(self, request: web.Request) -> web.Response:
+        data = await self._json(request)
+        if data.get("user") != self.serial_number or data.get("password") != PASSWORD:
+            raise web.HTTPUnauthorized(text="invalid credentials")
+        device_uuid = uuid_lib.uuid4().hex
+        self.sessions[device_uuid] = {"rtdataEnable": 1, "syncEnable": 0, "logdataEnable": 0}
+        return web.json_response({"uuid": device_uuid})
+
+    async def data_ctrl(self, request: web.Request) -> web.Response:
+        data = await self._json(request)
+        session = self._session(data)
+        for key in session:
+            if key in data:
+                session[key] = int(data[key])
+        return web.json_response({"result": 0})
+
+    async def sync(self, request: web.Request) -> web.StreamResponse:
+        """Stream synthetic logged frames, one per second of the window."""
+        data = await self._json(request)
+        self._session(data)
+        start = int(data.get("timestampFrom", 0))
+        end = int(data.get("timestampTo", 0))
+        response = web.StreamResponse()
+        response.content_type = "application/octet-stream"
+        await response.prepare(request)
+        if 0 < start < end:
+            generator = FrameGenerator(
+                self.sub_dev_num, seed=self._seed + start, start=start - 1
+            )
+            batch = bytearray()
+            for _ in range(start, end):
+                batch += generator.next_frame()
+                if len(batch) >= 64 * 1024:
+                    await response.write(bytes(batch))
+                    batch.clear()
+            if batch:
+                await response.write(bytes(batch))
+        await response.write_eof()
+        return response
+
+    async def system_info(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "serialNumber": self.serial_number,
+            "subDevNum": self.sub_dev_num,
+        })
+
+    def _next_message(self) -> bytes | None:
+        """Return the next message, or None to drop the connection."""
+        faults = self.faults
+        rnd = self._random.random
+        if rnd() < faults.drop:
+            return None
+        if rnd() < faults.foreign:
+            return build_frame(int(time.time()), (0, 0), [], type_=PKG_TYPE_SAMPLE_DATA + 1)
+        frame = self._generator.next_frame()
+        if rnd() < faults.malformed:
+            cut = self._random.randrange(0, len(frame))
+            return frame[:cut] + bytes(self._random.getrandbits(8) for _ in range(8))
+        return frame
+
+    async def websocket(self, request: web.Request) -> web.StreamResponse:
+        session = self.sessions.get(request.query.get("uuid"))
+        if session is None:
+            raise web.HTTPUnauthorized(text="unknown uuid")
+        ws = web.WebSocketResponse(autoping=True)
+        await ws.prepare(request)
+        self.connections += 1
+        reader = asyncio.create_task(self._drain(ws))
+        try:
+            while not ws.closed and not reader.done():
+                delay = self.interval * (1 + self._random.uniform(-self.jitter, self.jitter))
+                await asyncio.sleep(max(delay, 0))
+                if not session["rtdataEnable"]:
+                    continue
+                if self._random.random() < self.faults.stall:
+                    _LOGGER.info("%s: stalling stream", self.serial_number)
+                    await asyncio.sleep(self.faults.stall_seconds)
+                message = self._next_message()
+                if message is None:
+                    _LOGGER.info("%s: dropping connection", self.serial_number)
+                    if request.transport is not None:
+                        request.transport.close()
+                    break
+                await ws.send_bytes(message)
+                self.frames_sent += 1
+        except ConnectionResetError:
+            pass
+        finally:
+            reader.cancel()
+            self.connections -= 1
+        return ws
+
+    @staticmethod
+    async def _drain(ws: web.WebSocketResponse) -> None:
+        async for msg in ws:
+            if msg.type == WSMsgType.ERROR:
+                break
+
+
+async def serve(args: argparse.Namespace) -> None:
+    faults = Faults(
+        drop=args.drop_rate,
+        stall=args.stall_rate,
+        stall_seconds=args.stall_seconds,
+        malformed=args.malformed_rate,
+        foreign=args.foreign_rate,
+    )
+    runners = []
+    units = []
+    for index in range(args.units):
+        serial_number = f"{args.serial_base + index:06d}"
+        unit = SimulatedApollo(
+            serial_number, args.sub_devs, args.rate, args.jitter, faults, seed=index
+        )
+        runner = web.AppRunner(unit.app(), handle_signals=False)
+        await runner.setup()
+        site = web.TCPSite(runner, args.host, args.port + index)
+        await site.start()
+        runners.append(runner)
+        units.append(unit)
+        print(f"econest-hems-{serial_number} on {args.host}:{args.port + index}")
+    try:
+        while True:
+            await asyncio.sleep(args.report_interval)
+            print(
+                f"connections {sum(unit.connections for unit in units)}"
+                f"  frames sent {sum(unit.frames_sent for unit in units)}"
+            )
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--units", type=int, default=1)
+    parser.add_argument("--serial-base", type=int, default=100000)
+    parser.add_argument("--sub-devs", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=1.0, help="frames per second")
+    parser.add_argument("--jitter", type=float, default=0.1, help="fraction of the interval")
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--stall-seconds", type=float, default=30.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--foreign-rate", type=float, default=0.0, help="non-type-2 packets")
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
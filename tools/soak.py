@@ -0,0 +1,205 @@
+"""Reload the integration over and over against simulated devices.
+
+Boots a throwaway Home Assistant instance with the integration linked into
+its ``custom_components``, starts simulated devices from tools.simulator,
+then reloads every config entry repeatedly. After each round it records
+asyncio tasks, open sockets, traced memory and websocket connections on the
+devices, and fails if they keep growing::
+
+    python -m tools.soak --units 2 --rounds 50
+
+Needs a Home Assistant development environment.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+from pathlib import Path
+import socket
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from aiohttp import web
+
+from .frames import INTEGRATION_DIR
+from .simulator import Faults, SimulatedApollo
+
+DOMAIN = "cyberiot_apollo"
+
+
+def open_sockets() -> int:
+    """Return the number of sockets this process holds (Linux only)."""
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return -1
+    count = 0
+    for fd in fds:
+        try:
+            count += os.readlink(f"/proc/self/fd/{fd}").startswith("socket:")
+        except OSError:
+            pass
+    return count
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _start_units(args: argparse.Namespace) -> tuple[list[SimulatedApollo], list]:
+    units = []
+    runners = []
+    for index in range(args.units):
+        unit = SimulatedApollo(
+            f"{args.serial_base + index:06d}", args.sub_devs, args.rate, 0.1, Faults(), seed=index
+        )
+        runner = web.AppRunner(unit.app(), handle_signals=False)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", args.port + index).start()
+        units.append(unit)
+        runners.append(runner)
+    return units, runners
+
+
+async def _setup_hass(config_dir: Path):
+    from homeassistant import bootstrap, runner
+
+    (config_dir / "custom_components").mkdir()
+    (config_dir / "custom_components" / DOMAIN).symlink_to(INTEGRATION_DIR)
+    (config_dir / "configuration.yaml").write_text(
+        f"http:\n  server_host: 127.0.0.1\n  server_port: {_free_port()}\n"
+    )
+    hass = await bootstrap.async_setup_hass(
+        runner.RuntimeConfig(config_dir=str(config_dir), skip_pip=True)
+    )
+    if hass is None:
+        raise RuntimeError("Home Assistant failed to start")
+    await hass.async_start()
+    return hass
+
+
+async def _wait_for_frames(hass, entry_ids: list[str], timeout: float) -> bool:
+    from custom_components.cyberiot_apollo.hub import async_get_hub
+
+    hub = async_get_hub(hass)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        devices = [hub.get_device(entry_id) for entry_id in entry_ids]
+        if all(device is not None and device.frames for device in devices):
+            return True
+        await asyncio.sleep(0.1)
+    return False
+
+
+def _sample(units: list[SimulatedApollo]) -> dict[str, int]:
+    return {
+        "tasks": len(asyncio.all_tasks()),
+        "sockets": open_sockets(),
+        "memory_kib": tracemalloc.get_traced_memory()[0] // 1024,
+        "device_connections": sum(unit.connections for unit in units),
+        "device_sessions": sum(len(unit.sessions) for unit in units),
+    }
+
+
+def check(samples: list[dict[str, int]], args: argparse.Namespace) -> list[str]:
+    """Compare the last samples with the ones after warm-up."""
+    if not samples:
+        return ["no round was sampled"]
+    baseline = samples[min(args.warmup, len(samples) - 1)]
+    last = samples[-1]
+    failures = []
+    for key, slack in (("tasks", args.task_slack), ("sockets", args.socket_slack)):
+        if last[key] > baseline[key] + slack:
+            failures.append(f"{key} grew from {baseline[key]} to {last[key]}")
+    if last["memory_kib"] > baseline["memory_kib"] * (1 + args.memory_slack):
+        failures.append(
+            f"memory grew from {baseline['memory_kib']} KiB to {last['memory_kib']} KiB"
+        )
+    if last["device_connections"] != args.units:
+        failures.append(
+            f"{last['device_connections']} device connections for {args.units} devices"
+        )
+    if last["device_sessions"] != baseline["device_sessions"]:
+        failures.append(
+            f"devices registered {last['device_sessions'] - baseline['device_sessions']}"
+            " new sessions"
+        )
+    return failures
+
+
+async def soak(args: argparse.Namespace) -> int:
+    tracemalloc.start()
+    units, runners = await _start_units(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        sys.path.insert(0, tmp)
+        hass = await _setup_hass(Path(tmp))
+        try:
+            entry_ids = []
+            for index, unit in enumerate(units):
+                result = await hass.config_entries.flow.async_init(
+                    DOMAIN,
+                    context={"source": "user"},
+                    data={
+                        "serial_number": f"econest-hems-{unit.serial_number}",
+                        "host": f"127.0.0.1:{args.port + index}",
+                    },
+                )
+                if result["type"] != "create_entry":
+                    print(f"could not add device {unit.serial_number}: {result}")
+                    return 2
+                entry_ids.append(result["result"].entry_id)
+            await _wait_for_frames(hass, entry_ids, args.timeout)
+
+            samples = []
+            for round_ in range(args.rounds):
+                for entry_id in entry_ids:
+                    await hass.config_entries.async_reload(entry_id)
+                if not await _wait_for_frames(hass, entry_ids, args.timeout):
+                    print(f"round {round_}: no frames after reload")
+                    return 1
+                await asyncio.sleep(args.settle)
+                samples.append(sample := _sample(units))
+                print(f"round {round_:4}  " + "  ".join(f"{k} {v}" for k, v in sample.items()))
+        finally:
+            await hass.async_stop()
+            for runner in runners:
+                await runner.cleanup()
+
+    failures = check(samples, args)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("resources stayed flat")
+    return 1 if failures else 0
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--units", type=int, default=2)
+    parser.add_argument("--port", type=int, default=18180)
+    parser.add_argument("--serial-base", type=int, default=200000)
+    parser.add_argument("--sub-devs", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=10.0, help="frames per second")
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=5, help="rounds before the baseline")
+    parser.add_argument("--settle", type=float, default=1.0, help="seconds between rounds")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--task-slack", type=int, default=2)
+    parser.add_argument("--socket-slack", type=int, default=2)
+    parser.add_argument("--memory-slack", type=float, default=0.1, help="allowed growth ratio")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    if args.rounds < 1:
+        parser.error("--rounds must be at least 1")
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    sys.exit(asyncio.run(soak(args)))
+
+
+if __name__ == "__main__":
+    main()